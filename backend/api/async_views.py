@@ -0,0 +1,263 @@
+"""Асинхронные view для режима ASGI.
+
+В Django 3.2 нет асинхронного ORM, а синхронные view под ASGI выполняются
+по очереди в одном общем потоке. Поэтому здесь вся работа с БД уходит
+в пул потоков, а независимые запросы страницы идут параллельно через
+asyncio.gather. Всё, что эти view не обрабатывают сами (запись, курсоры,
+ошибки валидации), выполняет обычный viewset в том же пуле.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .fields import to_int
+from .filters import DEFAULT_RECIPE_ORDERING, RecipeFilter
+from .pagination import CustomPagination
+from .recipe_cache import render_recipes
+from .serializers import RecipeSerializer
+from .shopping_list import (FORMATTERS, SHOPPING_LIST_FILENAME,
+                            get_cart_etag, iter_cart_items)
+from backend.instrumentation import current_metrics, timing, track_queries
+from foodgram.models import Cart, Favorite, Follow, Recipe
+
+
+def database_sync_to_async(func, thread_sensitive=False):
+    """sync_to_async для кода, который ходит в БД.
+
+    Запросы попадают в метрики текущего HTTP-запроса, а соединение
+    потока после вызова закрывается по тем же правилам, что и после
+    обычного запроса.
+    """
+    def run(*args, **kwargs):
+        metrics = current_metrics()
+        try:
+            if metrics is None:
+                return func(*args, **kwargs)
+            with track_queries(metrics):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=thread_sensitive)
+
+
+def rendered(view):
+    def render(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    return render
+
+
+def async_view(sync_view, handler=None):
+    """Асинхронный view поверх sync_view.
+
+    GET отдаётся handler; если его нет или он вернул None, запрос целиком
+    выполняет sync_view в пуле потоков.
+    """
+    fallback = database_sync_to_async(rendered(sync_view))
+
+    async def view(request, *args, **kwargs):
+        if handler is not None and request.method == 'GET':
+            response = await handler(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await fallback(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+def get_api_request(request):
+    api_request = Request(request, authenticators=[
+        auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        request.user = api_request.user
+    except APIException:
+        return None
+    return api_request
+
+
+def json_response(data):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type='application/json'
+    )
+
+
+def get_page(request):
+    try:
+        page = int(request.GET.get(CustomPagination.page_query_param, 1))
+        size = int(request.GET.get(
+            CustomPagination.page_size_query_param,
+            CustomPagination.page_size
+        ))
+    except ValueError:
+        return None, None
+    if page < 1 or size < 1:
+        return None, None
+    return page, size
+
+
+def page_link(request, page):
+    url = request.build_absolute_uri()
+    if page == 1:
+        return remove_query_param(url, CustomPagination.page_query_param)
+    return replace_query_param(url, CustomPagination.page_query_param, page)
+
+
+def filter_recipes(api_request):
+    filterset = RecipeFilter(
+        api_request.query_params,
+        Recipe.objects.defer('search_vector'),
+        request=api_request
+    )
+    if not filterset.is_valid():
+        return None
+    queryset = filterset.qs
+    # Поиск и ordering задают свой порядок, остальным нужен однозначный.
+    if not queryset.query.order_by:
+        queryset = queryset.order_by(*DEFAULT_RECIPE_ORDERING)
+    return queryset
+
+
+def id_set(queryset):
+    return set(queryset)
+
+
+async def recipe_list(request):
+    page, size = get_page(request)
+    if page is None or CustomPagination.cursor_query_param in request.GET:
+        return None
+    api_request = await database_sync_to_async(get_api_request)(request)
+    if api_request is None:
+        return None
+    queryset = await database_sync_to_async(filter_recipes)(api_request)
+    if queryset is None:
+        return None
+
+    user = request.user
+    offset = (page - 1) * size
+    tasks = [
+        database_sync_to_async(queryset.count)(),
+        database_sync_to_async(list)(queryset[offset:offset + size]),
+    ]
+    if user.is_authenticated:
+        page_ids = queryset.values('pk')[offset:offset + size]
+        page_authors = queryset.values('author')[offset:offset + size]
+        tasks.extend(database_sync_to_async(id_set)(flags) for flags in (
+            Favorite.objects.filter(
+                user=user, recipe__in=page_ids
+            ).values_list('recipe_id', flat=True),
+            Cart.objects.filter(
+                user=user, recipe__in=page_ids
+            ).values_list('recipe_id', flat=True),
+            Follow.objects.filter(
+                user=user, following__in=page_authors
+            ).values_list('following_id', flat=True),
+        ))
+    count, recipes, *flags = await asyncio.gather(*tasks)
+    if offset >= count and page > 1:
+        return None
+    favorites, cart, following = flags or (set(), set(), set())
+    for recipe in recipes:
+        recipe.in_favorite = recipe.pk in favorites
+        recipe.in_shopping_cart = recipe.pk in cart
+        recipe.author_subscribed = recipe.author_id in following
+
+    with timing('serialize'):
+        results = await database_sync_to_async(render_recipes)(
+            recipes, request, RecipeSerializer
+        )
+    return json_response({
+        'count': count,
+        'next': (page_link(request, page + 1)
+                 if offset + size < count else None),
+        'previous': page_link(request, page - 1) if page > 1 else None,
+        'results': results,
+    })
+
+
+def get_recipe(pk, user_id):
+    return Recipe.objects.defer('search_vector').add_user_annotations(
+        user_id
+    ).filter(pk=pk).first()
+
+
+async def recipe_detail(request, pk):
+    pk = to_int(pk)
+    if pk is None:
+        return None
+    if await database_sync_to_async(get_api_request)(request) is None:
+        return None
+    recipe = await database_sync_to_async(get_recipe)(pk, request.user.id)
+    if recipe is None:
+        return None
+    with timing('serialize'):
+        results = await database_sync_to_async(render_recipes)(
+            [recipe], request, RecipeSerializer
+        )
+    return json_response(results[0]) if results else None
+
+
+async def download_shopping_cart(request):
+    file_format = request.GET.get('file_format', 'txt')
+    if file_format not in FORMATTERS:
+        return None
+    if await database_sync_to_async(get_api_request)(request) is None:
+        return None
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    etag = await database_sync_to_async(get_cart_etag)(user, file_format)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    # Django 3.2 перебирает StreamingHttpResponse прямо в цикле событий,
+    # где запросы к БД запрещены, поэтому список собирается целиком.
+    items = await database_sync_to_async(list)(iter_cart_items(user))
+    formatter = FORMATTERS[file_format]()
+    filename = f'{SHOPPING_LIST_FILENAME}.{formatter.extension}'
+    response = HttpResponse(
+        ''.join(formatter.render(items)), content_type=formatter.content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    response['ETag'] = etag
+    return response
+
+
+ASYNC_HANDLERS = {
+    'recipes-list': recipe_list,
+    'recipes-detail': recipe_detail,
+    'recipes-download-shopping-cart': download_shopping_cart,
+}
+
+
+def with_async_views(patterns):
+    """Делает асинхронными все маршруты роутера.
+
+    Для маршрутов из ASYNC_HANDLERS GET обрабатывается асинхронно,
+    остальные view выполняются в пуле потоков, а не по очереди в общем
+    потоке, как синхронные view под ASGI.
+    """
+    result = []
+    for pattern in patterns:
+        handler = None
+        if 'format' not in pattern.pattern.regex.groupindex:
+            handler = ASYNC_HANDLERS.get(pattern.name)
+        result.append(URLPattern(
+            pattern.pattern,
+            async_view(pattern.callback, handler),
+            pattern.default_args,
+            pattern.name
+        ))
+    return result
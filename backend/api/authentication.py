@@ -0,0 +1,169 @@
+"""Аутентификация по токену без запроса к БД на каждый запрос.
+
+Пара (пользователь, токен) хранится в ограниченном LRU-кеше процесса,
+за ним — необязательный общий кеш Django. Удаление токена (выход через
+djoser) и любое сохранение пользователя сбрасывают запись в этом
+процессе и в общем кеше. До локальных кешей других процессов сброс не
+доходит, поэтому запись живёт в них всего TOKEN_CACHE_LOCAL_TTL секунд
+(по умолчанию 5), а в общем кеше — TOKEN_CACHE_TTL.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from backend.instrumentation import register_collector
+
+User = get_user_model()
+
+
+def token_key(key):
+    # В общем кеше не храним сам токен, только его хеш.
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+class TokenCache:
+    """LRU-кеш токенов процесса с TTL и счётчиками попаданий.
+
+    ttl — время жизни записи в общем кеше, local_ttl — в кеше процесса.
+    """
+
+    def __init__(self, max_size, ttl, shared, local_ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.local_ttl = min(local_ttl, ttl)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = {'local': 0, 'shared': 0}
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits['local'] += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+        if self.shared:
+            value = cache.get(token_key(key))
+            if value is not None:
+                self.put_local(key, value)
+                with self.lock:
+                    self.hits['shared'] += 1
+                return value
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put_local(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.local_ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def put(self, key, value):
+        self.put_local(key, value)
+        if self.shared:
+            cache.set(token_key(key), value, self.ttl)
+
+    def delete(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.shared and keys:
+            cache.delete_many([token_key(key) for key in keys])
+
+    def delete_user(self, user_id):
+        with self.lock:
+            keys = {key for key, (_, (user, _)) in self.entries.items()
+                    if user.pk == user_id}
+        if self.shared:
+            keys.update(Token.objects.filter(
+                user_id=user_id
+            ).values_list('key', flat=True))
+        self.delete(keys)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': dict(self.hits),
+                'misses': self.misses,
+                'size': len(self.entries),
+            }
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+    shared=getattr(settings, 'TOKEN_CACHE_SHARED', False),
+    local_ttl=getattr(settings, 'TOKEN_CACHE_LOCAL_TTL', 5),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.put(key, (user, token))
+        else:
+            user, token = cached
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+        # Каждому запросу своя копия, чтобы потоки не делили кеши
+        # связанных объектов и атрибуты, выставленные во view.
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    token_cache.delete([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if not created:
+        token_cache.delete_user(instance.pk)
+
+
+def render_metrics():
+    stats = token_cache.stats()
+    lines = [
+        '# HELP foodgram_token_cache_hits_total Попадания в кеш токенов.',
+        '# TYPE foodgram_token_cache_hits_total counter',
+    ]
+    lines.extend(f'foodgram_token_cache_hits_total{{layer="{layer}"}} {hits}'
+                 for layer, hits in sorted(stats['hits'].items()))
+    lines.extend([
+        '# HELP foodgram_token_cache_misses_total Промахи кеша токенов.',
+        '# TYPE foodgram_token_cache_misses_total counter',
+        f'foodgram_token_cache_misses_total {stats["misses"]}',
+        '# HELP foodgram_token_cache_size Токенов в кеше процесса.',
+        '# TYPE foodgram_token_cache_size gauge',
+        f'foodgram_token_cache_size {stats["size"]}',
+    ])
+    return lines
+
+
+register_collector(render_metrics)
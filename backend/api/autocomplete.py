@@ -0,0 +1,95 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from foodgram.models import Ingredient
+from foodgram.signals import INGREDIENTS_VERSION_KEY
+
+# Версия в кеше сбрасывает индекс сразу после изменения ингредиентов,
+# а MAX_AGE ограничивает устаревание для воркеров с отдельным locmem-кешем.
+MAX_AGE = 300
+MAX_LIMIT = 100
+TRIGRAM_SIZE = 3
+
+
+def trigrams(value):
+    return {value[i:i + TRIGRAM_SIZE]
+            for i in range(len(value) - TRIGRAM_SIZE + 1)}
+
+
+class IngredientIndex:
+    """Отсортированный по названию каталог ингредиентов в памяти.
+
+    Совпадения по началу названия ищутся бинарным поиском, совпадения
+    по подстроке — пересечением списков триграмм.
+    """
+
+    def __init__(self, ingredients, version):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.items = sorted(
+            ingredients, key=lambda item: (item['name'].lower(), item['id'])
+        )
+        self.keys = [item['name'].lower() for item in self.items]
+        self.postings = defaultdict(set)
+        for position, key in enumerate(self.keys):
+            for trigram in trigrams(key):
+                self.postings[trigram].add(position)
+
+    def is_fresh(self, version):
+        return (self.version == version
+                and time.monotonic() - self.built_at < MAX_AGE)
+
+    def prefix_positions(self, query):
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + '\uffff', lo=start)
+        return range(start, end)
+
+    def contains_positions(self, query):
+        if len(query) < TRIGRAM_SIZE:
+            return []
+        candidates = None
+        for trigram in trigrams(query):
+            postings = self.postings.get(trigram)
+            if not postings:
+                return []
+            candidates = (postings if candidates is None
+                          else candidates & postings)
+        return sorted(
+            position for position in candidates
+            if query in self.keys[position]
+            and not self.keys[position].startswith(query)
+        )
+
+    def search(self, query, limit=None):
+        query = query.lower()
+        found = []
+        for positions in (self.prefix_positions(query),
+                          self.contains_positions(query)):
+            for position in positions:
+                if limit is not None and len(found) >= limit:
+                    return found
+                found.append(self.items[position])
+        return found
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    version = cache.get(INGREDIENTS_VERSION_KEY, 0)
+    if _index is None or not _index.is_fresh(version):
+        with _lock:
+            if _index is None or not _index.is_fresh(version):
+                _index = IngredientIndex(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'
+                    ),
+                    version
+                )
+    return _index
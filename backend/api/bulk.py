@@ -0,0 +1,190 @@
+"""Пакетное добавление и удаление избранного, корзины и подписок.
+
+Все id запроса обрабатываются одним bulk_create(ignore_conflicts=True)
+или одним DELETE ... WHERE ... IN. Сигналы при этом не приходят, поэтому
+счётчики и список покупок пересчитываются для затронутых строк сразу
+после записи.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from foodgram.models import (AuthorStats, Cart, Favorite, Follow, Recipe,
+                             RecipeIngredient)
+from foodgram.shopping_list import sync_shopping_lists
+from foodgram.signals import recount_counter
+
+User = get_user_model()
+MAX_BULK_IDS = 100
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_IDS
+    )
+
+
+class BulkRelation:
+    """Связи пользователя с объектами через поле target_field модели."""
+    model = None
+    target_field = None
+    targets = None
+    exists_message = None
+    absent_message = None
+
+    def __init__(self, user):
+        self.user = user
+
+    def related(self, ids):
+        return self.model.objects.filter(
+            user=self.user, **{f'{self.target_field}__in': ids}
+        )
+
+    def get_error(self, pk):
+        """Причина, по которой с объектом pk нельзя создать связь."""
+        return None
+
+    def changed(self, ids):
+        """Пересчёт данных, которые обычно обновляют сигналы."""
+
+    def split(self, ids):
+        found = set(self.targets.filter(pk__in=ids).values_list(
+            'pk', flat=True
+        ))
+        existing = set(self.related(found).values_list(
+            f'{self.target_field}_id', flat=True
+        ))
+        return found, existing
+
+    @transaction.atomic
+    def add(self, ids):
+        found, existing = self.split(ids)
+        results, created = [], []
+        for pk in ids:
+            error = self.get_error(pk)
+            if pk not in found:
+                results.append(failed(pk, 'not_found', 'Объект не найден.'))
+            elif error:
+                results.append(failed(pk, 'invalid', error))
+            elif pk in existing:
+                results.append(failed(pk, 'exists', self.exists_message))
+            else:
+                results.append({'id': pk, 'status': 'created'})
+                created.append(pk)
+        if created:
+            self.model.objects.bulk_create(
+                [self.model(user=self.user, **{f'{self.target_field}_id': pk})
+                 for pk in created],
+                ignore_conflicts=True
+            )
+            self.changed(created)
+        return results
+
+    @transaction.atomic
+    def remove(self, ids):
+        found, existing = self.split(ids)
+        results = []
+        for pk in ids:
+            if pk not in found:
+                results.append(failed(pk, 'not_found', 'Объект не найден.'))
+            elif pk not in existing:
+                results.append(failed(pk, 'absent', self.absent_message))
+            else:
+                results.append({'id': pk, 'status': 'deleted'})
+        if existing:
+            self.delete(existing)
+            self.changed(existing)
+        return results
+
+    def delete(self, ids):
+        """Удаляет связи одним DELETE без выборки строк и сигналов.
+
+        На эти модели никто не ссылается, каскадов нет.
+        """
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(opts.db_table)} '
+                f'WHERE {quote(opts.get_field("user").column)} = %s '
+                f'AND {quote(opts.get_field(self.target_field).column)} '
+                f'IN ({placeholders})',
+                [self.user.pk, *ids]
+            )
+
+
+def failed(pk, status, message):
+    return {'id': pk, 'status': status, 'errors': message}
+
+
+class FavoriteRelation(BulkRelation):
+    model = Favorite
+    target_field = 'recipe'
+    targets = Recipe.objects
+    exists_message = 'Уже в избранном.'
+    absent_message = 'Не в избранном.'
+
+    def changed(self, ids):
+        recount_counter(
+            Recipe.objects.filter(pk__in=ids), 'favorites_count',
+            Favorite.objects, 'recipe'
+        )
+
+
+class CartRelation(BulkRelation):
+    model = Cart
+    target_field = 'recipe'
+    targets = Recipe.objects
+    exists_message = 'Уже в корзине.'
+    absent_message = 'Нет в корзине.'
+
+    def changed(self, ids):
+        recount_counter(
+            Recipe.objects.filter(pk__in=ids), 'cart_count',
+            Cart.objects, 'recipe'
+        )
+        sync_shopping_lists(
+            [self.user.pk],
+            RecipeIngredient.objects.filter(recipe__in=ids).values(
+                'ingredient'
+            )
+        )
+
+
+class FollowRelation(BulkRelation):
+    model = Follow
+    target_field = 'following'
+    targets = User.objects
+    exists_message = 'Вы уже подписаны.'
+    absent_message = 'Вы не подписаны.'
+
+    def get_error(self, pk):
+        if pk == self.user.pk:
+            return 'Вы не можете подписаться на себя.'
+        return None
+
+    def changed(self, ids):
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in ids], ignore_conflicts=True
+        )
+        recount_counter(
+            AuthorStats.objects.filter(user_id__in=ids), 'followers_count',
+            Follow.objects, 'following'
+        )
+
+
+def bulk_response(relation_class, request):
+    """Ответ пакетного эндпоинта: результат по каждому id запроса."""
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['ids']))
+    relation = relation_class(request.user)
+    if request.method == 'POST':
+        results = relation.add(ids)
+    else:
+        results = relation.remove(ids)
+    return Response({'results': results})
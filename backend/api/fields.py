@@ -0,0 +1,123 @@
+from collections import Counter
+
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+def to_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value, minimum=1, maximum=None):
+    """Целое число из параметра запроса или None, если это не число
+    или оно вне границ.
+
+    str.isdigit() пропускает символы вроде '²', на которых int() падает.
+    """
+    number = to_pk(value)
+    if number is None or number < minimum:
+        return None
+    if maximum is not None and number > maximum:
+        return None
+    return number
+
+
+def resolve_pks(queryset, values):
+    """Находит все объекты одним запросом id__in.
+
+    Возвращает словарь {pk: объект} и список ошибок, в котором перечислены
+    сразу все повторяющиеся и несуществующие id.
+    """
+    pks = [pk for pk in map(to_pk, values) if pk is not None]
+    objects = queryset.in_bulk(set(pks))
+    errors = []
+    duplicates = sorted(pk for pk, count in Counter(pks).items() if count > 1)
+    if duplicates:
+        errors.append('Повторяются id: {}.'.format(
+            ', '.join(map(str, duplicates))
+        ))
+    missing = sorted(set(pks) - set(objects))
+    if missing:
+        errors.append('Не найдены объекты с id: {}.'.format(
+            ', '.join(map(str, missing))
+        ))
+    return objects, errors
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        objects, errors = resolve_pks(self.child_relation.get_queryset(), data)
+        if errors:
+            raise serializers.ValidationError(errors)
+        self.child_relation.resolved = objects
+        try:
+            return [self.child_relation.to_internal_value(item)
+                    for item in data]
+        finally:
+            self.child_relation.resolved = None
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True или внутри
+    BulkListSerializer получает объекты заранее одним запросом.
+    """
+    resolved = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        if self.resolved is not None and to_pk(data) in self.resolved:
+            return self.resolved[to_pk(data)]
+        return super().to_internal_value(data)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """ListSerializer для вложенной записи с many=True.
+
+    Все BulkPrimaryKeyRelatedField дочернего сериализатора разрешаются
+    одним запросом на поле, а не запросом на каждый элемент.
+    """
+
+    def bulk_fields(self):
+        return {
+            name: field for name, field in self.child.fields.items()
+            if isinstance(field, BulkPrimaryKeyRelatedField)
+        }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        fields = self.bulk_fields()
+        errors = {}
+        for name, field in fields.items():
+            values = [item.get(name, empty) for item in data
+                      if isinstance(item, dict)]
+            objects, field_errors = resolve_pks(
+                field.get_queryset(),
+                [value for value in values if value is not empty]
+            )
+            if field_errors:
+                errors[name] = field_errors
+            field.resolved = objects
+        try:
+            if errors:
+                raise serializers.ValidationError(errors)
+            return super().to_internal_value(data)
+        finally:
+            for field in fields.values():
+                field.resolved = None
@@ -1,7 +1,23 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from django_filters import filters
 
-from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.models import (Cart, Favorite, Ingredient, Recipe, RecipeTag,
+                             Tag)
+from foodgram.search import search_recipes
+
+DEFAULT_RECIPE_ORDERING = ('-pub_date', '-id')
+# Оценки считает по расписанию команда refresh_recipe_scores.
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def get_recipe_ordering(query_params):
+    return RECIPE_ORDERINGS.get(
+        query_params.get('ordering'), DEFAULT_RECIPE_ORDERING
+    )
 
 
 class IngredientFilter(django_filters.FilterSet):
@@ -15,24 +31,45 @@ class IngredientFilter(django_filters.FilterSet):
 class RecipeFilter(django_filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
-        field_name='tags__slug',
         to_field_name='slug',
+        method='get_tags',
     )
     is_favorited = filters.NumberFilter(method='get_favorited')
     is_in_shopping_cart = filters.NumberFilter(method='get_in_shopping_cart')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(RecipeTag.objects.filter(
+            tag__in=value, recipe=OuterRef('pk')
+        )))
 
     def get_favorited(self, queryset, name, value):
-        queryset.add_user_annotations(self.request.user.id)
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
 
     def get_in_shopping_cart(self, queryset, name, value):
-        queryset.add_user_annotations(self.request.user.id)
         if value and self.request.user.is_authenticated:
-            return queryset.filter(cart__user=self.request.user)
+            return queryset.filter(Exists(Cart.objects.filter(
+                user=self.request.user, recipe=OuterRef('pk')
+            )))
         return queryset
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
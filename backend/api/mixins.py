@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+CATALOG_MAX_AGE = 60
+# Сброс версии в кеше процесса не доходит до других воркеров, поэтому
+# без общего кеша ответ живёт столько же, сколько у клиента.
+CATALOG_CACHE_TIMEOUT = 60 * 60 if settings.CACHE_SHARED else CATALOG_MAX_AGE
+
+
+class CatalogCacheMixin:
+    """Кеширует list и retrieve справочников по версии из кеша.
+
+    Версию cache_version_key поднимают сигналы при изменении модели, после
+    чего меняются ключи закешированных ответов. ETag считается по
+    содержимому ответа и хранится вместе с ним, поэтому воркер, до
+    которого не дошёл сброс версии, не ответит 304 на новые данные
+    дольше, чем живёт ответ в его кеше.
+    """
+    cache_version_key = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def cached_response(self, request, view, *args, **kwargs):
+        version = cache.get(self.cache_version_key, 0)
+        key = 'catalog:{}'.format(hashlib.md5(
+            f'{self.cache_version_key}:{version}:'
+            f'{request.get_full_path()}'.encode()
+        ).hexdigest())
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            etag = '"{}"'.format(hashlib.md5(
+                JSONRenderer().render(data)
+            ).hexdigest())
+            cache.set(key, (etag, data), CATALOG_CACHE_TIMEOUT)
+        else:
+            etag, data = cached
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=CATALOG_MAX_AGE)
+        return response
@@ -0,0 +1,151 @@
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+DEFAULT_PAGE_SIZE = 10
+COUNT_CACHE_TIMEOUT = 60
+
+
+class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    По умолчанию работают привычные параметры page и limit. Если в запросе
+    есть параметр cursor (для первой страницы — пустой), выборка идёт по
+    ключу keyset_ordering без OFFSET, а count берётся из кеша.
+    """
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    keyset_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+    force_keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = getattr(view, 'keyset_ordering', self.keyset_ordering)
+        # Без ключа (например, при поиске, где порядок задаёт ранг) курсор
+        # не применяется и работает обычная постраничная пагинация.
+        self.keyset_mode = self.ordering is not None and (
+            self.force_keyset
+            or self.cursor_query_param in request.query_params
+        )
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.count = self.get_cached_count(queryset)
+        page_size = self.get_page_size(request)
+        reverse, position = self.decode_cursor(request, queryset.model)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self.invert(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and (position is not None) and (has_more or not reverse):
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_cursor_link(self.next_position, False)),
+            ('previous', self.get_cursor_link(self.previous_position, True)),
+            ('results', data)
+        ]))
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, position):
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[name]})
+            for previous in ordering[:index]:
+                previous = previous.lstrip('-')
+                step &= Q(**{previous: position[previous]})
+            condition |= step
+        return condition
+
+    def get_position(self, instance):
+        return {
+            field.lstrip('-'): getattr(instance, field.lstrip('-'))
+            for field in self.ordering
+        }
+
+    def get_cached_count(self, queryset):
+        key = 'pagination-count-' + hashlib.md5(
+            str(queryset.query).encode()
+        ).hexdigest()
+        return cache.get_or_set(key, queryset.count, COUNT_CACHE_TIMEOUT)
+
+    def encode_cursor(self, position, reverse):
+        payload = {
+            'r': int(reverse),
+            'p': {name: str(value) for name, value in position.items()},
+        }
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            position = {
+                name: model._meta.get_field(name).to_python(value)
+                for name, value in payload['p'].items()
+            }
+            reverse = bool(payload['r'])
+        except (BinasciiError, ValueError, KeyError, TypeError,
+                AttributeError, FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if set(position) != {field.lstrip('-') for field in self.ordering}:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def get_cursor_link(self, position, reverse):
+        if position is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param,
+            self.encode_cursor(position, reverse)
+        )
+
+
+class FeedPagination(CustomPagination):
+    force_keyset = True
+
+
+class ListPagination(PageNumberPagination):
+    """Постраничная пагинация готового списка, например результатов
+    поиска по индексу в памяти."""
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
@@ -0,0 +1,169 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from foodgram.models import Recipe, RecipeIngredient, RecipeTag
+from foodgram.signals import RECIPES_VERSION_KEY
+
+# Версия в кеше поднимается после коммита изменений рецепта, и индекс
+# догружает рецепты, изменённые с прошлого обновления. MAX_AGE
+# ограничивает устаревание от записей без сигналов (bulk-операции,
+# каскадное удаление ингредиентов): после него индекс строится заново.
+MAX_AGE = 600
+# Рецепт, изменённый в долгой транзакции, получает updated раньше
+# коммита, поэтому изменения догружаются с запасом.
+SYNC_MARGIN = timedelta(minutes=1)
+BATCH_SIZE = 1000
+
+PantryRecipe = namedtuple(
+    'PantryRecipe', ('ingredients', 'tags', 'cooking_time')
+)
+
+
+def load_recipes(queryset):
+    """Состав, теги и время приготовления рецептов queryset."""
+    recipes = {
+        pk: (set(), set(), cooking_time)
+        for pk, cooking_time in queryset.values_list(
+            'pk', 'cooking_time'
+        ).iterator(chunk_size=BATCH_SIZE)
+    }
+    for model, field, position in (
+        (RecipeIngredient, 'ingredient_id', 0), (RecipeTag, 'tag_id', 1)
+    ):
+        rows = model.objects.filter(
+            recipe__in=queryset.values('pk')
+        ).values_list('recipe_id', field)
+        for recipe_id, value in rows.iterator(chunk_size=BATCH_SIZE):
+            if recipe_id in recipes:
+                recipes[recipe_id][position].add(value)
+    return {
+        pk: PantryRecipe(tuple(sorted(ingredients)), tuple(tags),
+                         cooking_time)
+        for pk, (ingredients, tags, cooking_time) in recipes.items()
+    }
+
+
+def insort(postings, value):
+    position = bisect_left(postings, value)
+    if position == len(postings) or postings[position] != value:
+        postings.insert(position, value)
+
+
+def discard(postings, value):
+    position = bisect_left(postings, value)
+    if position < len(postings) and postings[position] == value:
+        del postings[position]
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент -> отсортированный массив id рецептов.
+
+    Совпадения по набору продуктов считаются слиянием массивов через
+    Counter, доля покрытия — по числу ингредиентов рецепта. Обновление
+    не меняет индекс на месте, а собирает новый с общими массивами
+    нетронутых ингредиентов, поэтому читать индекс можно без блокировки.
+    """
+
+    def __init__(self, recipes, version, synced, built_at=None,
+                 postings=None):
+        self.recipes = recipes
+        self.version = version
+        self.synced = synced
+        self.built_at = time.monotonic() if built_at is None else built_at
+        if postings is None:
+            postings = {}
+            for pk in sorted(recipes):
+                for ingredient_id in recipes[pk].ingredients:
+                    postings.setdefault(
+                        ingredient_id, array('q')
+                    ).append(pk)
+        self.postings = postings
+
+    @classmethod
+    def build(cls, version):
+        synced = timezone.now()
+        return cls(load_recipes(Recipe.objects.all()), version, synced)
+
+    def is_expired(self):
+        return time.monotonic() - self.built_at >= MAX_AGE
+
+    def refreshed(self, version):
+        """Новый индекс с изменёнными и без удалённых рецептов."""
+        synced = timezone.now()
+        changed = load_recipes(Recipe.objects.filter(
+            updated__gte=self.synced - SYNC_MARGIN
+        ))
+        existing = set(Recipe.objects.values_list('pk', flat=True))
+        removed = [pk for pk in self.recipes if pk not in existing]
+        recipes = dict(self.recipes)
+        postings = dict(self.postings)
+        copied = set()
+
+        def edit(ingredient_id):
+            if ingredient_id not in copied:
+                copied.add(ingredient_id)
+                postings[ingredient_id] = array(
+                    'q', postings.get(ingredient_id, ())
+                )
+            return postings[ingredient_id]
+
+        for pk in removed:
+            for ingredient_id in recipes.pop(pk).ingredients:
+                discard(edit(ingredient_id), pk)
+        for pk, recipe in changed.items():
+            previous = recipes.get(pk)
+            old = set(previous.ingredients) if previous else set()
+            new = set(recipe.ingredients)
+            for ingredient_id in old - new:
+                discard(edit(ingredient_id), pk)
+            for ingredient_id in new - old:
+                insort(edit(ingredient_id), pk)
+            recipes[pk] = recipe
+        return PantryIndex(recipes, version, synced, self.built_at, postings)
+
+    def search(self, ingredient_ids, tag_ids=None, max_cooking_time=None):
+        """Рецепты хотя бы с одним продуктом из набора.
+
+        Возвращает кортежи (id, совпало, всего ингредиентов), от большей
+        доли покрытия к меньшей, при равной — больше совпадений и новее.
+        """
+        matched = Counter()
+        for ingredient_id in set(ingredient_ids):
+            matched.update(self.postings.get(ingredient_id, ()))
+        found = []
+        for pk, count in matched.items():
+            recipe = self.recipes[pk]
+            if tag_ids is not None and tag_ids.isdisjoint(recipe.tags):
+                continue
+            if (max_cooking_time is not None
+                    and recipe.cooking_time > max_cooking_time):
+                continue
+            found.append((pk, count, len(recipe.ingredients)))
+        found.sort(key=lambda item: (item[1] / item[2], item[1], item[0]),
+                   reverse=True)
+        return found
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    version = cache.get(RECIPES_VERSION_KEY, 0)
+    index = _index
+    if index is None or index.is_expired() or index.version != version:
+        with _lock:
+            if _index is None or _index.is_expired():
+                _index = PantryIndex.build(version)
+            elif _index.version != version:
+                _index = _index.refreshed(version)
+            index = _index
+    return index
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from foodgram.images import variants_ready
+from foodgram.models import Recipe
+from foodgram.signals import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
+
+User = get_user_model()
+
+# Поднимается при изменении полей RecipeSerializer, чтобы не отдавать
+# представления старого формата из общего кеша.
+REPRESENTATION_VERSION = 2
+# Сброс в кеше процесса не доходит до других воркеров.
+RECIPE_CACHE_TIMEOUT = 10 * 60 if settings.CACHE_SHARED else 60
+# Поля автора, которые попадают в представление рецепта.
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+def catalog_versions():
+    """Версии тегов и ингредиентов, названия и цвета которых входят
+    в представление рецепта."""
+    versions = cache.get_many((TAGS_VERSION_KEY, INGREDIENTS_VERSION_KEY))
+    return '{}.{}'.format(
+        versions.get(TAGS_VERSION_KEY, 0),
+        versions.get(INGREDIENTS_VERSION_KEY, 0)
+    )
+
+
+def recipe_key(pk, versions):
+    return f'recipe:{REPRESENTATION_VERSION}:{versions}:{pk}'
+
+
+def invalidate_recipes(pks):
+    versions = catalog_versions()
+    cache.delete_many([recipe_key(pk, versions) for pk in pks])
+
+
+def get_shared_representations(recipes, serializer_class):
+    """Общая для всех пользователей часть представлений рецептов.
+
+    Берётся из кеша по id рецепта и версиям тегов и ингредиентов, промахи
+    сериализуются одним батчем без запроса, поэтому флаги пользователя
+    в них всегда False.
+    """
+    versions = catalog_versions()
+    keys = {recipe_key(recipe.pk, versions): recipe.pk for recipe in recipes}
+    found = cache.get_many(keys)
+    missing = [pk for key, pk in keys.items() if key not in found]
+    if missing:
+        fresh = {
+            recipe_key(recipe.pk, versions): serializer_class(recipe).data
+            for recipe in Recipe.objects.with_related().filter(pk__in=missing)
+        }
+        cache.set_many(fresh, RECIPE_CACHE_TIMEOUT)
+        found.update(fresh)
+    return {pk: found[key] for key, pk in keys.items() if key in found}
+
+
+def render_recipes(recipes, request, serializer_class):
+    """Представления рецептов страницы с флагами текущего пользователя.
+
+    Флаги берутся из аннотаций add_user_annotations, которые приходят
+    вместе со строками страницы.
+    """
+    shared = get_shared_representations(recipes, serializer_class)
+    data = []
+    for recipe in recipes:
+        if recipe.pk not in shared:
+            continue
+        item = dict(shared[recipe.pk])
+        item['author'] = dict(
+            item['author'], is_subscribed=recipe.author_subscribed
+        )
+        item['is_favorited'] = recipe.in_favorite
+        item['is_in_shopping_cart'] = recipe.in_shopping_cart
+        if item['image']:
+            item['image'] = request.build_absolute_uri(item['image'])
+        item['images'] = {
+            size: request.build_absolute_uri(url)
+            for size, url in item['images'].items()
+        }
+        data.append(item)
+    return data
+
+
+@receiver(variants_ready)
+def variants_ready_handler(sender, recipe_id, **kwargs):
+    invalidate_recipes([recipe_id])
+
+
+# Сброс после коммита, иначе параллельный запрос успеет положить в кеш
+# рецепт из ещё не закоммиченной транзакции в старом виде.
+@receiver(post_save, sender=Recipe)
+def recipe_saved_handler(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_recipes([instance.pk]))
+
+
+@receiver(post_save, sender=User)
+def author_saved_handler(sender, instance, created, update_fields=None,
+                         **kwargs):
+    # Вход пользователя сохраняет только last_login.
+    if created or (update_fields is not None
+                   and AUTHOR_FIELDS.isdisjoint(update_fields)):
+        return
+    transaction.on_commit(lambda: invalidate_recipes(
+        Recipe.objects.filter(author=instance).values_list('pk', flat=True)
+    ))
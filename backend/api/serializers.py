@@ -2,14 +2,31 @@ from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
 
+from .fields import BulkListSerializer, BulkPrimaryKeyRelatedField, to_int
+from foodgram.images import delete_images, schedule_variants, variant_urls
+from foodgram.shopping_list import sync_recipe
 from foodgram.models import (Recipe, Follow, Ingredient, Favorite,
-                             Tag, RecipeTag, RecipeIngredient, Cart)
+                             Tag, RecipeTag, RecipeIngredient, Cart,
+                             ShoppingListItem)
 
 User = get_user_model()
 DEFAULT_PAGE_SIZE = 10
 
 
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return DEFAULT_PAGE_SIZE
+    limit = to_int(recipes_limit)
+    if limit is None:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Должно быть целым положительным числом.'}
+        )
+    return limit
+
+
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
@@ -20,8 +37,10 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return request.user.follower.filter(following=obj.id).exists()
 
     def create(self, validated_data):
@@ -56,6 +75,19 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     author = CustomUserSerializer(read_only=True)
@@ -63,25 +95,38 @@ class RecipeSerializer(serializers.ModelSerializer):
                                              source='recipe_ingredients')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    images = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
+                  'is_in_shopping_cart', 'name', 'image', 'images',
                   'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'in_favorite'):
+            return obj.in_favorite
         return request.user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'in_shopping_cart'):
+            return obj.in_shopping_cart
         return request.user.cart.filter(recipe=obj).exists()
 
+    def get_images(self, obj):
+        request = self.context.get('request')
+        urls = variant_urls(obj)
+        if request:
+            return {size: request.build_absolute_uri(url)
+                    for size, url in urls.items()}
+        return urls
+
 
 class SubRecipeSerializer(serializers.ModelSerializer):
 
@@ -144,13 +189,17 @@ class SubscriptionSerializer(CustomUserSerializer):
                   'is_subscribed', 'recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get('request').query_params.get(
-            'recipes_limit', DEFAULT_PAGE_SIZE)
-        recipes = obj.recipes.all()[:int(recipes_limit)]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
         return SubRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
+        stats = getattr(obj, 'stats', None)
+        return stats.recipes_count if stats else 0
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -192,16 +241,17 @@ class FollowSerializer(serializers.ModelSerializer):
 
 class CreateRecipeIngredientSerializer(RecipeIngredientSerializer):
     # Без этой строчки создание рецептов не работает
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
+        list_serializer_class = BulkListSerializer
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
     ingredients = CreateRecipeIngredientSerializer(many=True)
 
@@ -213,9 +263,14 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        user_id = request.user.id if request else None
+        instance = Recipe.objects.with_related(user_id).add_user_annotations(
+            user_id
+        ).get(pk=instance.pk)
         return RecipeSerializer(
             instance=instance,
-            context={'request': self.context.get('request')}
+            context={'request': request}
         ).data
 
     def add_tags_ingredients(self, ingredients, tags, model):
@@ -233,17 +288,79 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             recipetags_data.append(RecipeTag(recipe=model, tag=tag))
         RecipeTag.objects.bulk_create(recipetags_data)
 
+    def update_ingredients(self, recipe, ingredients):
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        wanted = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = [ingredient_id for ingredient_id in existing
+                   if ingredient_id not in wanted]
+        if removed:
+            RecipeIngredient.objects.filter(
+                pk__in=[existing[ingredient_id].pk
+                        for ingredient_id in removed]
+            ).delete()
+        changed, added = [], []
+        for ingredient_id, amount in wanted.items():
+            recipe_ingredient = existing.get(ingredient_id)
+            if recipe_ingredient is None:
+                added.append(RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                ))
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        if added:
+            RecipeIngredient.objects.bulk_create(added)
+        if removed or changed or added:
+            # Сигналов у RecipeIngredient нет: списки покупок всех, у кого
+            # рецепт в корзине, пересчитываются здесь одним вызовом.
+            sync_recipe(recipe.pk, removed + [
+                recipe_ingredient.ingredient_id
+                for recipe_ingredient in changed + added
+            ])
+
+    def update_tags(self, recipe, tags):
+        existing = {tag.id for tag in recipe.tags.all()}
+        wanted = {tag.id for tag in tags}
+        if existing - wanted:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=existing - wanted
+            ).delete()
+        if wanted - existing:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in wanted - existing
+            )
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = super().create(validated_data)
         self.add_tags_ingredients(ingredients, tags, recipe)
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        instance.tags.clear()
-        self.add_tags_ingredients(ingredients, tags, instance)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        old_image, old_variants = instance.image.name, instance.image_variants
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            delete_images(old_image, old_variants)
+            schedule_variants(recipe)
+        return recipe
@@ -0,0 +1,108 @@
+import csv
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from foodgram.models import ShoppingListItem
+from foodgram.shopping_list import get_version
+from foodgram.signals import INGREDIENTS_VERSION_KEY
+
+SHOPPING_LIST_FILENAME = 'shopping_list'
+ITERATOR_CHUNK_SIZE = 500
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class TextFormatter:
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, items):
+        for num, item in enumerate(items, start=1):
+            yield (f'{num}. {item["name"]} - '
+                   f'{item["amount"]} {item["measurement_unit"]} \n')
+
+
+class CSVFormatter:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for item in items:
+            yield writer.writerow(
+                (item['name'], item['amount'], item['measurement_unit'])
+            )
+
+
+class JSONFormatter:
+    content_type = 'application/json; charset=utf-8'
+    extension = 'json'
+
+    def render(self, items):
+        yield '['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ','
+        yield ']'
+
+
+FORMATTERS = {
+    'txt': TextFormatter,
+    'csv': CSVFormatter,
+    'json': JSONFormatter,
+}
+
+
+def get_cart_items(user):
+    return ShoppingListItem.objects.filter(user=user).values(
+        'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def iter_cart_items(user):
+    """Список покупок по индексу user, строки читаются итератором."""
+    for item in get_cart_items(user).iterator(
+        chunk_size=ITERATOR_CHUNK_SIZE
+    ):
+        yield {
+            'name': item['ingredient__name'],
+            'amount': item['total_amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }
+
+
+def get_cart_etag(user, file_format):
+    """ETag списка покупок.
+
+    С общим кешем — без выборки самого списка: версию списка поднимает
+    каждая запись его строк, версию справочника ингредиентов — изменение
+    названий и единиц измерения. В кеше процесса эти версии не видят
+    сбросов из других воркеров, поэтому без общего кеша ETag считается
+    по содержимому списка.
+    """
+    if settings.CACHE_SHARED:
+        state = '{}-{}'.format(
+            get_version(user.id), cache.get(INGREDIENTS_VERSION_KEY, 0)
+        )
+    else:
+        digest = hashlib.md5()
+        for item in get_cart_items(user).iterator(
+            chunk_size=ITERATOR_CHUNK_SIZE
+        ):
+            digest.update('{}\t{}\t{}\n'.format(
+                item['ingredient__name'],
+                item['ingredient__measurement_unit'],
+                item['total_amount']
+            ).encode())
+        state = digest.hexdigest()
+    return f'"{user.id}-{file_format}-{state}"'
@@ -0,0 +1,37 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import TokenCache, token_cache
+from .utils import create_user
+
+
+class TokenCacheTest(SimpleTestCase):
+
+    def test_local_entries_expire_after_local_ttl(self):
+        tokens = TokenCache(max_size=10, ttl=60, shared=False, local_ttl=5)
+        with mock.patch('api.authentication.time.monotonic', return_value=0):
+            tokens.put('key', 'value')
+        with mock.patch('api.authentication.time.monotonic', return_value=4):
+            self.assertEqual(tokens.get('key'), 'value')
+        with mock.patch('api.authentication.time.monotonic', return_value=5):
+            self.assertIsNone(tokens.get('key'))
+
+    def test_local_ttl_not_longer_than_ttl(self):
+        tokens = TokenCache(max_size=10, ttl=3, shared=False, local_ttl=5)
+        self.assertEqual(tokens.local_ttl, 3)
+
+
+class TokenLogoutTest(APITestCase):
+
+    def setUp(self):
+        token_cache.delete(list(token_cache.entries))
+        self.token = Token.objects.create(user=create_user(0))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_deleted_token_rejected(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
@@ -0,0 +1,52 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from foodgram.models import Tag
+from foodgram.signals import TAGS_VERSION_KEY
+from .utils import create_tags
+
+TAGS_URL = '/api/tags/'
+
+
+class CatalogCacheTest(APITestCase):
+    """Закешированные справочники и их ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = create_tags(2)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(TAGS_URL, **headers)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_saved_tag_changes_etag(self):
+        etag = self.get()['ETag']
+        tag = self.tags[0]
+        tag.name = 'Новое название'
+        tag.save()
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(
+            'Новое название', [item['name'] for item in response.data]
+        )
+
+    def test_expired_response_without_version_bump(self):
+        # Так выглядит воркер с кешем процесса, до которого не дошёл
+        # сброс версии: версия та же, но ответ в кеше уже истёк.
+        etag = self.get()['ETag']
+        Tag.objects.filter(pk=self.tags[0].pk).update(name='Новое название')
+        version = cache.get(TAGS_VERSION_KEY)
+        cache.clear()
+        if version is not None:
+            cache.set(TAGS_VERSION_KEY, version, None)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
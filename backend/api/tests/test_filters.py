@@ -0,0 +1,149 @@
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import RequestFactory
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+
+from foodgram.models import Cart, Favorite, Recipe
+from api.filters import RecipeFilter
+from .utils import create_recipe, create_tags, create_user
+
+SQLITE_INDEX_SEARCH = (
+    r'SEARCH \S+ USING (COVERING )?INDEX \S+ \({}=\? AND recipe_id=\?\)'
+)
+
+
+class RecipeFilterTest(APITestCase):
+    """Фильтры по тегам, избранному и корзине отдают каждый рецепт один
+    раз и только рецепты текущего пользователя."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.other = create_user(1)
+        cls.breakfast, cls.lunch, cls.dinner = create_tags(3)
+        cls.both = create_recipe(
+            cls.user, tags=(cls.breakfast, cls.lunch), number=0
+        )
+        cls.lunch_only = create_recipe(cls.user, tags=(cls.lunch,), number=1)
+        cls.dinner_only = create_recipe(
+            cls.other, tags=(cls.dinner,), number=2
+        )
+        for recipe in (cls.both, cls.lunch_only):
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in (cls.both, cls.dinner_only):
+            Favorite.objects.create(user=cls.other, recipe=recipe)
+            Cart.objects.create(user=cls.other, recipe=recipe)
+        Cart.objects.create(user=cls.user, recipe=cls.dinner_only)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?limit=100&{query}')
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(response.data['count'], len(ids))
+        return set(ids)
+
+    def test_tags(self):
+        self.assertEqual(
+            self.get_ids(f'tags={self.breakfast.slug}&tags={self.lunch.slug}'),
+            {self.both.pk, self.lunch_only.pk}
+        )
+        self.assertEqual(
+            self.get_ids(f'tags={self.dinner.slug}'), {self.dinner_only.pk}
+        )
+
+    def test_favorited(self):
+        self.assertEqual(
+            self.get_ids('is_favorited=1'), {self.both.pk, self.lunch_only.pk}
+        )
+
+    def test_in_shopping_cart(self):
+        self.assertEqual(
+            self.get_ids('is_in_shopping_cart=1'), {self.dinner_only.pk}
+        )
+
+    def test_combined(self):
+        self.assertEqual(
+            self.get_ids(
+                f'tags={self.breakfast.slug}&tags={self.lunch.slug}'
+                '&is_favorited=1'
+            ),
+            {self.both.pk, self.lunch_only.pk}
+        )
+        self.assertEqual(
+            self.get_ids(f'tags={self.lunch.slug}&is_in_shopping_cart=1'),
+            set()
+        )
+
+    def test_flags_off_or_anonymous(self):
+        every = {self.both.pk, self.lunch_only.pk, self.dinner_only.pk}
+        self.assertEqual(self.get_ids('is_favorited=0'), every)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.get_ids('is_favorited=1'), every)
+
+
+class RecipeFilterPlanTest(APITestCase):
+    """Фильтры — полусоединения EXISTS по составным индексам
+    RecipeTag(tag, recipe), Favorite(user, recipe) и Cart(user, recipe)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.tag, = create_tags(1)
+
+    def filter(self, params):
+        request = Request(RequestFactory().get('/'))
+        request.user = self.user
+        return RecipeFilter(params, Recipe.objects.all(), request=request).qs
+
+    def assertUsesIndex(self, queryset, index, column):
+        sql = str(queryset.query)
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('JOIN', sql)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # На маленьких тестовых таблицах планировщик иначе выберет
+                # последовательное чтение.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            self.assertIn(f'using {index}', queryset.explain())
+        elif connection.vendor == 'sqlite':
+            self.assertRegex(
+                queryset.explain(),
+                re.compile(SQLITE_INDEX_SEARCH.format(column))
+            )
+        else:
+            self.skipTest('Планы проверяются на PostgreSQL и SQLite.')
+
+    def test_tags(self):
+        self.assertUsesIndex(
+            self.filter({'tags': [self.tag.slug]}),
+            'recipetag_tag_recipe_idx', 'tag_id'
+        )
+
+    def test_favorited(self):
+        self.assertUsesIndex(
+            self.filter({'is_favorited': '1'}),
+            'unique_favorite_user_recipe', 'user_id'
+        )
+
+    def test_in_shopping_cart(self):
+        self.assertUsesIndex(
+            self.filter({'is_in_shopping_cart': '1'}),
+            'unique_user_recipe', 'user_id'
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'Только PostgreSQL.')
+    def test_all_filters_postgresql(self):
+        plan = self.filter({
+            'tags': [self.tag.slug], 'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        }).explain()
+        self.assertNotIn('Unique', plan)
+        self.assertNotIn('HashAggregate', plan)
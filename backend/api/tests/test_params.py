@@ -0,0 +1,63 @@
+from rest_framework.test import APITestCase
+
+from api.autocomplete import MAX_LIMIT
+from foodgram.similarity import TOP_K
+from .utils import create_ingredients, create_recipe, create_user
+
+# '²'.isdigit() истинно, но int('²') падает с ValueError.
+BAD_NUMBERS = ('²', 'abc', '0', '-1', '1.5', '')
+
+
+class QueryParamsTest(APITestCase):
+    """Числовые параметры запроса с мусором дают 400, а не 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def assertBadRequest(self, url, param, values=BAD_NUMBERS, **params):
+        for value in values:
+            with self.subTest(**{param: value}):
+                response = self.client.get(url, {**params, param: value})
+                self.assertEqual(response.status_code, 400)
+
+    def test_recipes_limit(self):
+        self.assertBadRequest('/api/users/subscriptions/', 'recipes_limit')
+        response = self.client.get(
+            '/api/users/subscriptions/', {'recipes_limit': '2'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_pantry(self):
+        url = '/api/recipes/pantry/'
+        self.assertBadRequest(url, 'ingredients', ('²', '1,²', 'abc', '0'))
+        for cooking_time in ('²', '-1', 'abc'):
+            with self.subTest(cooking_time=cooking_time):
+                response = self.client.get(
+                    url, {'ingredients': '1', 'cooking_time': cooking_time}
+                )
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {'ingredients': '1,2'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_similar(self):
+        recipe = create_recipe(self.user)
+        url = f'/api/recipes/{recipe.pk}/similar/'
+        self.assertBadRequest(url, 'limit', (*BAD_NUMBERS, str(TOP_K + 1)))
+        self.assertEqual(self.client.get(url, {'limit': '3'}).status_code, 200)
+        response = self.client.get('/api/recipes/²/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_autocomplete_limit(self):
+        create_ingredients(MAX_LIMIT + 5)
+        url = '/api/ingredients/'
+        self.assertBadRequest(url, 'limit', name='инг')
+        response = self.client.get(url, {'name': 'инг', 'limit': '2'})
+        self.assertEqual(len(response.data), 2)
+        response = self.client.get(
+            url, {'name': 'инг', 'limit': str(MAX_LIMIT * 10)}
+        )
+        self.assertEqual(len(response.data), MAX_LIMIT)
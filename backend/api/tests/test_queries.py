@@ -0,0 +1,87 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from foodgram.models import Cart, Favorite, Follow
+from .utils import (QueryCountMixin, create_ingredients, create_recipe,
+                    create_tags, create_user)
+
+
+class ReadQueriesTest(QueryCountMixin, APITestCase):
+    """Число запросов списков и карточки не зависит от размера страницы
+    и от числа ингредиентов и тегов рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.authors = [create_user(number) for number in range(1, 13)]
+        tags = create_tags(3)
+        ingredients = create_ingredients(10)
+        cls.recipes = [
+            create_recipe(
+                cls.authors[number % len(cls.authors)],
+                ingredients[:1 + number % 10], tags[:1 + number % 3], number
+            )
+            for number in range(24)
+        ]
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            Cart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, following=author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, size=None):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        if size is not None:
+            self.assertEqual(len(response.data['results']), size)
+        return response
+
+    def test_recipe_list(self):
+        self.assertSameQueries(
+            lambda: self.get('/api/recipes/?limit=2', 2),
+            lambda: self.get('/api/recipes/?limit=20', 20)
+        )
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertSameQueries(
+            lambda: self.get('/api/recipes/?limit=2', 2),
+            lambda: self.get('/api/recipes/?limit=20', 20)
+        )
+
+    def test_recipe_list_cursor(self):
+        self.assertSameQueries(
+            lambda: self.get('/api/recipes/?cursor=&limit=2', 2),
+            lambda: self.get('/api/recipes/?cursor=&limit=20', 20)
+        )
+
+    def test_recipe_detail(self):
+        small, large = self.recipes[0], self.recipes[-1]
+        self.assertLess(
+            small.recipe_ingredients.count(), large.recipe_ingredients.count()
+        )
+        self.assertSameQueries(
+            lambda: self.get(f'/api/recipes/{small.pk}/'),
+            lambda: self.get(f'/api/recipes/{large.pk}/')
+        )
+
+    def test_subscriptions(self):
+        self.assertSameQueries(
+            lambda: self.get('/api/users/subscriptions/?limit=2', 2),
+            lambda: self.get('/api/users/subscriptions/?limit=10', 10)
+        )
+
+    def test_subscriptions_recipes_limit(self):
+        self.assertSameQueries(
+            lambda: self.get(
+                '/api/users/subscriptions/?limit=10&recipes_limit=1', 10
+            ),
+            lambda: self.get(
+                '/api/users/subscriptions/?limit=10&recipes_limit=3', 10
+            )
+        )
@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from .utils import (committed, create_ingredients, create_recipe, create_tags,
+                    create_user)
+
+
+class RecipeCacheTest(APITestCase):
+    """Закешированные представления рецептов сбрасываются при изменении
+    тегов, ингредиентов и авторов, которые в них встроены."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.tag = create_tags(1)[0]
+        cls.ingredient = create_ingredients(1)[0]
+        cls.recipe = create_recipe(cls.author, [cls.ingredient], [cls.tag])
+
+    def setUp(self):
+        cache.clear()
+        self.get_recipe()
+
+    def get_recipe(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'][0]
+
+    def test_tag_saved(self):
+        self.tag.color = '#ffffff'
+        self.tag.save()
+        self.assertEqual(self.get_recipe()['tags'][0]['color'], '#ffffff')
+
+    def test_ingredient_saved(self):
+        self.ingredient.measurement_unit = 'кг'
+        self.ingredient.save()
+        self.assertEqual(
+            self.get_recipe()['ingredients'][0]['measurement_unit'], 'кг'
+        )
+
+    def test_author_saved(self):
+        with committed():
+            self.author.first_name = 'Другое'
+            self.author.save()
+        self.assertEqual(self.get_recipe()['author']['first_name'], 'Другое')
+
+    def test_recipe_saved(self):
+        with committed():
+            self.recipe.name = 'Другое название'
+            self.recipe.save()
+        self.assertEqual(self.get_recipe()['name'], 'Другое название')
@@ -0,0 +1,136 @@
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from foodgram.models import Cart, RecipeIngredient, ShoppingListItem
+from foodgram.shopping_list import sync_shopping_lists
+from .utils import (QueryCountMixin, create_ingredients, create_recipe,
+                    create_tags, create_user)
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+RECIPE_TABLES = ('foodgram_recipeingredient', 'foodgram_recipetag',
+                 'foodgram_shoppinglistitem')
+
+
+class RecipeUpdateQueriesTest(QueryCountMixin, APITestCase):
+    """PATCH рецепта пишет только разницу составов и тегов, и число
+    запросов не растёт с размером этой разницы и числом корзин."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.buyers = [create_user(number) for number in range(1, 4)]
+        cls.other_buyer = create_user(4)
+        cls.ingredients = create_ingredients(30)
+        cls.tags = create_tags(6)
+        cls.recipe = create_recipe(
+            cls.author, cls.ingredients[:5], cls.tags[:2]
+        )
+        cls.other = create_recipe(
+            cls.author, cls.ingredients[:5], cls.tags[:2], 1
+        )
+        for buyer in cls.buyers:
+            Cart.objects.create(user=buyer, recipe=cls.recipe)
+        Cart.objects.create(user=cls.other_buyer, recipe=cls.other)
+        sync_shopping_lists(
+            [buyer.pk for buyer in (*cls.buyers, cls.other_buyer)]
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def patch(self, ingredients, tags, amount=10, recipe=None):
+        recipe = recipe or self.recipe
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': amount}
+                    for ingredient in ingredients
+                ],
+                'tags': [tag.pk for tag in tags],
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_unchanged_writes_nothing(self):
+        with self.assertNumQueries(
+            self.count_queries(lambda: self.patch(
+                self.ingredients[:5], self.tags[:2]
+            ))
+        ):
+            self.patch(self.ingredients[:5], self.tags[:2])
+        changed = self.count_queries(lambda: self.patch(
+            self.ingredients[:6], self.tags[:2]
+        ))
+        self.assertLess(
+            self.count_queries(lambda: self.patch(
+                self.ingredients[:6], self.tags[:2]
+            )),
+            changed
+        )
+
+    def test_unchanged_does_not_touch_relations(self):
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.patch(self.ingredients[:5], self.tags[:2])
+        for query in context.captured_queries:
+            sql = query['sql']
+            if sql.startswith(WRITES):
+                self.assertFalse(
+                    any(table in sql for table in RECIPE_TABLES), sql
+                )
+
+    def test_added_ingredients(self):
+        self.assertSameQueries(
+            lambda: self.patch(self.ingredients[:6], self.tags[:2]),
+            lambda: self.patch(self.ingredients[:26], self.tags[:2])
+        )
+
+    def test_removed_ingredients(self):
+        self.patch(self.ingredients[:26], self.tags[:2])
+        self.assertSameQueries(
+            lambda: self.patch(self.ingredients[:25], self.tags[:2]),
+            lambda: self.patch(self.ingredients[:5], self.tags[:2])
+        )
+
+    def test_changed_amounts(self):
+        self.assertSameQueries(
+            lambda: self.patch(self.ingredients[:5], self.tags[:2], 20),
+            lambda: self.patch(self.ingredients[:5], self.tags[:2], 30)
+        )
+
+    def test_added_and_removed_tags(self):
+        self.assertSameQueries(
+            lambda: self.patch(self.ingredients[:5], self.tags[:3]),
+            lambda: self.patch(self.ingredients[:5], self.tags)
+        )
+        self.assertSameQueries(
+            lambda: self.patch(self.ingredients[:5], self.tags[:5]),
+            lambda: self.patch(self.ingredients[:5], self.tags[:2])
+        )
+
+    def test_carts_do_not_add_queries(self):
+        self.assertSameQueries(
+            lambda: self.patch(
+                self.ingredients[:20], self.tags[:2], recipe=self.other
+            ),
+            lambda: self.patch(self.ingredients[:20], self.tags[:2])
+        )
+
+    def test_shopping_lists_follow_update(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patch(self.ingredients[3:12], self.tags[:2], 7)
+        for buyer in self.buyers:
+            expected = dict(RecipeIngredient.objects.filter(
+                recipe__cart__user=buyer
+            ).values('ingredient').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient', 'total'))
+            actual = dict(ShoppingListItem.objects.filter(
+                user=buyer
+            ).values_list('ingredient', 'total_amount'))
+            self.assertEqual(actual, expected)
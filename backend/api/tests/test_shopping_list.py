@@ -0,0 +1,79 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from foodgram.models import Cart
+from .utils import (committed, create_ingredients, create_recipe, create_tags,
+                    create_user)
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListETagTest(APITestCase):
+    """ETag скачивания меняется вместе с содержимым списка покупок.
+
+    По умолчанию в тестах кеш процесса, и ETag считается по содержимому.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user(0)
+        cls.buyer = create_user(1)
+        cls.ingredients = create_ingredients(3)
+        cls.tags = create_tags(1)
+        cls.recipe = create_recipe(cls.author, cls.ingredients, cls.tags)
+
+    def setUp(self):
+        with committed():
+            Cart.objects.create(user=self.buyer, recipe=self.recipe)
+
+    def download(self, etag=None):
+        self.client.force_authenticate(self.buyer)
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(DOWNLOAD_URL, **headers)
+
+    def assertETagChanged(self, etag):
+        response = self.download(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_unchanged_list_not_modified(self):
+        etag = self.download()['ETag']
+        self.assertEqual(self.download(etag).status_code, 304)
+
+    def test_amounts_with_same_sums(self):
+        etag = self.download()['ETag']
+        self.client.force_authenticate(self.author)
+        with committed():
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.pk}/',
+                {
+                    'ingredients': [
+                        {'id': ingredient.pk, 'amount': amount}
+                        for ingredient, amount in zip(
+                            self.ingredients, (11, 8, 11)
+                        )
+                    ],
+                    'tags': [tag.pk for tag in self.tags],
+                },
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertETagChanged(etag)
+
+    def test_ingredient_renamed(self):
+        etag = self.download()['ETag']
+        ingredient = self.ingredients[0]
+        ingredient.measurement_unit = 'кг'
+        ingredient.save()
+        self.assertETagChanged(etag)
+
+    def test_cart_emptied(self):
+        etag = self.download()['ETag']
+        with committed():
+            Cart.objects.filter(user=self.buyer).delete()
+        self.assertETagChanged(etag)
+
+
+@override_settings(CACHE_SHARED=True)
+class SharedCacheShoppingListETagTest(ShoppingListETagTest):
+    """То же с общим кешем, где ETag строится по версиям."""
@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from foodgram.models import (Ingredient, Recipe, RecipeIngredient, RecipeTag,
+                             Tag)
+
+User = get_user_model()
+
+
+def create_user(number):
+    return User.objects.create_user(
+        username=f'user{number}', email=f'user{number}@example.com',
+        password='Pa55word!', first_name='Имя', last_name='Фамилия'
+    )
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}', color=f'#{number:06d}', slug=f'tag{number}'
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, ingredients=(), tags=(), number=0):
+    recipe = Recipe.objects.create(
+        author=author, name=f'Рецепт {number}', text='Текст',
+        cooking_time=10, image='foodgram/images/recipe.png'
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tag) for tag in tags
+    )
+    return recipe
+
+
+@contextmanager
+def committed():
+    """Выполняет on_commit-колбэки блока, как после настоящего коммита.
+
+    В отличие от captureOnCommitCallbacks в Django 3.2 выполняет и те
+    колбэки, которые регистрируются во время выполнения других.
+    """
+    start = len(connection.run_on_commit)
+    yield
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
+
+
+class QueryCountMixin:
+    """Сравнение числа запросов к БД при холодном кеше."""
+
+    def count_queries(self, func):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                func()
+        return len(context)
+
+    def assertSameQueries(self, first, second):
+        """second делает столько же запросов к БД, сколько first."""
+        expected = self.count_queries(first)
+        cache.clear()
+        with self.assertNumQueries(expected):
+            with self.captureOnCommitCallbacks(execute=True):
+                second()
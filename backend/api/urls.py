@@ -1,5 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework import routers
+
+from .async_views import with_async_views
 from .views import (RecipeViewSet, TagViewSet,
                     IngredientViewSet, CustomUserViewSet)
 
@@ -9,7 +12,11 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    router_urls = with_async_views(router_urls)
+
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include(router.urls)),
+    path('', include(router_urls)),
 ]
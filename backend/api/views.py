@@ -1,35 +1,47 @@
 from rest_framework import viewsets, status
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import BooleanField, Prefetch, Value
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
-from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 from djoser.views import UserViewSet
 from django.contrib.auth import get_user_model
 
 from .permissions import IsAuthorOrReadOnly
-from .filters import IngredientFilter, RecipeFilter
-from foodgram.models import (Recipe, Tag, Ingredient, RecipeIngredient)
+from .autocomplete import MAX_LIMIT as MAX_AUTOCOMPLETE_LIMIT, get_index
+from .bulk import (CartRelation, FavoriteRelation, FollowRelation,
+                   bulk_response)
+from .fields import to_int
+from .filters import IngredientFilter, RecipeFilter, get_recipe_ordering
+from .mixins import CatalogCacheMixin
+from .recipe_cache import render_recipes
+from .pagination import CustomPagination, FeedPagination, ListPagination
+from .pantry import get_index as get_pantry_index
+from .shopping_list import (FORMATTERS, SHOPPING_LIST_FILENAME,
+                            get_cart_etag, iter_cart_items)
+from backend.instrumentation import timing
+from foodgram.models import Recipe, Tag, Ingredient, ShoppingListItem
+from foodgram.signals import INGREDIENTS_VERSION_KEY, TAGS_VERSION_KEY
+from foodgram.similarity import TOP_K
 from .serializers import (SubscriptionSerializer, TagSerializer,
                           IngredientSerializer, FollowSerializer,
                           RecipeSerializer, CreateRecipeSerializer,
-                          FavoriteSerializer, CartSerializer)
+                          FavoriteSerializer, CartSerializer,
+                          ShoppingListItemSerializer, get_recipes_limit)
 
 User = get_user_model()
-DEFAULT_PAGE_SIZE = 10
-
-
-class CustomPagination(PageNumberPagination):
-    page_size = DEFAULT_PAGE_SIZE
-    page_size_query_param = 'limit'
+SIMILAR_LIMIT = 6
+MAX_PANTRY_INGREDIENTS = 50
 
 
 class CustomUserViewSet(UserViewSet):
     http_method_names = ('get', 'post', 'delete',)
     pagination_class = CustomPagination
+    keyset_ordering = ('id',)
 
     @action(
         methods=('get',),
@@ -38,11 +50,23 @@ class CustomUserViewSet(UserViewSet):
         pagination_class=CustomPagination
     )
     def subscriptions(self, request, *args, **kwargs):
-        queryset = User.objects.filter(following__user=request.user)
+        latest_recipes = Recipe.objects.latest_per_author(
+            get_recipes_limit(request)
+        ).only('id', 'name', 'image', 'cooking_time', 'author_id', 'pub_date')
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).select_related('stats').prefetch_related(
+            Prefetch('recipes', queryset=latest_recipes,
+                     to_attr='latest_recipes')
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             page, many=True, context={'request': request})
-        return self.get_paginated_response(serializer.data)
+        with timing('serialize'):
+            data = serializer.data
+        return self.get_paginated_response(data)
 
     @action(
         methods=('post', 'delete'),
@@ -51,6 +75,7 @@ class CustomUserViewSet(UserViewSet):
         pagination_class=CustomPagination
     )
     def subscribe(self, request, *args, **kwargs):
+        get_recipes_limit(request)
         followed_user = get_object_or_404(User, pk=self.kwargs.get('id'))
         serializer = FollowSerializer(
             data={'user': request.user.id, 'following': followed_user.id},
@@ -68,20 +93,49 @@ class CustomUserViewSet(UserViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='subscribe',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_subscribe(self, request):
+        return bulk_response(FollowRelation, request)
+
     def perform_create(self, serializer):
         serializer.save()
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_version_key = TAGS_VERSION_KEY
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    cache_version_key = INGREDIENTS_VERSION_KEY
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(request, self.autocomplete)
+
+    def autocomplete(self, request):
+        name = request.query_params.get('name')
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            limit = to_int(limit)
+            if limit is None:
+                return Response(
+                    {'errors': 'limit должен быть положительным числом.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            limit = min(limit, MAX_AUTOCOMPLETE_LIMIT)
+        return Response(get_index().search(name, limit))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -93,6 +147,118 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def keyset_ordering(self):
+        # Результаты поиска упорядочены по рангу, которого нет среди полей
+        # рецепта, поэтому курсор к ним не применим.
+        if self.request.query_params.get('search'):
+            return None
+        return get_recipe_ordering(self.request.query_params)
+
+    def get_queryset(self):
+        queryset = Recipe.objects.defer('search_vector').add_user_annotations(
+            self.request.user.id
+        )
+        if self.action in ('list', 'feed', 'similar', 'pantry'):
+            return queryset
+        return queryset.with_related(self.request.user.id)
+
+    def render_page(self, queryset):
+        page = self.paginate_queryset(queryset)
+        with timing('serialize'):
+            data = render_recipes(
+                queryset if page is None else page,
+                self.request,
+                self.get_serializer_class()
+            )
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.render_page(self.filter_queryset(self.get_queryset()))
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author__in=request.user.follower.values('following')
+        )
+        return self.render_page(queryset)
+
+    @action(methods=('get',), detail=True)
+    def similar(self, request, pk=None):
+        limit = to_int(
+            request.query_params.get('limit', SIMILAR_LIMIT), maximum=TOP_K
+        )
+        if limit is None:
+            return Response(
+                {'errors': f'limit должен быть числом от 1 до {TOP_K}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        pk = to_int(pk)
+        if pk is None:
+            raise NotFound()
+        recipes = list(self.get_queryset().filter(
+            similar_to__recipe_id=pk
+        ).order_by('-similar_to__score', 'id')[:limit])
+        if not recipes:
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        with timing('serialize'):
+            data = render_recipes(
+                recipes, request, self.get_serializer_class()
+            )
+        return Response(data)
+
+    @action(methods=('get',), detail=False, pagination_class=ListPagination)
+    def pantry(self, request):
+        params = request.query_params
+        ingredients = [
+            to_int(value) for values in params.getlist('ingredients')
+            for value in values.split(',') if value
+        ]
+        if (not ingredients or len(ingredients) > MAX_PANTRY_INGREDIENTS
+                or None in ingredients):
+            return Response(
+                {'errors': 'ingredients — от 1 до '
+                           f'{MAX_PANTRY_INGREDIENTS} id ингредиентов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        cooking_time = params.get('cooking_time')
+        if cooking_time is not None:
+            cooking_time = to_int(cooking_time, minimum=0)
+            if cooking_time is None:
+                return Response(
+                    {'errors': 'cooking_time должен быть числом.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        tag_ids = None
+        if params.getlist('tags'):
+            tag_ids = frozenset(Tag.objects.filter(
+                slug__in=params.getlist('tags')
+            ).values_list('pk', flat=True))
+        with timing('pantry'):
+            found = get_pantry_index().search(
+                ingredients, tag_ids, cooking_time
+            )
+        page = self.paginate_queryset(found)
+        recipes = self.get_queryset().in_bulk([pk for pk, _, _ in page])
+        with timing('serialize'):
+            data = render_recipes(
+                [recipes[pk] for pk, _, _ in page if pk in recipes],
+                request, self.get_serializer_class()
+            )
+        counts = {pk: (matched, total) for pk, matched, total in page}
+        for item in data:
+            matched, total = counts[item['id']]
+            item['coverage'] = round(matched / total, 3)
+            item['missing_ingredients'] = total - matched
+        return self.get_paginated_response(data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -143,33 +309,59 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='favorite',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_favorite(self, request):
+        return bulk_response(FavoriteRelation, request)
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,)
+    )
+    def bulk_shopping_cart(self, request):
+        return bulk_response(CartRelation, request)
+
     @action(
         methods=('get',),
         detail=False,
         permission_classes=(IsAuthenticated,)
     )
-    def download_shopping_cart(self, request):
-        cart_ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__cart__user=request.user
-            ).values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
-            ).annotate(cart_amount=Sum('amount'))
+    def shopping_list(self, request):
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by(
+            'ingredient__name', 'ingredient__measurement_unit'
         )
-        shopping_list = ''
-        num = 0
-        for item in cart_ingredients:
-            num += 1
-            name = item['ingredient__name']
-            measurement_unit = item['ingredient__measurement_unit']
-            amount = item['cart_amount']
-            shopping_list += (f'{num}. {name} - '
-                              f'{amount} {measurement_unit} \n')
-        filename = 'shopping_list.txt'
-        response = HttpResponse(
-            shopping_list,
-            content_type='text/plain,charset=utf8'
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,)
+    )
+    def download_shopping_cart(self, request):
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in FORMATTERS:
+            return Response(
+                {'errors': f'Неизвестный формат: {file_format}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        etag = get_cart_etag(request.user, file_format)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        formatter = FORMATTERS[file_format]()
+        filename = f'{SHOPPING_LIST_FILENAME}.{formatter.extension}'
+        response = StreamingHttpResponse(
+            formatter.render(iter_cart_items(request.user)),
+            content_type=formatter.content_type
         )
         response['Content-Disposition'] = f'attachment; filename={filename}'
+        response['ETag'] = etag
         return response
@@ -0,0 +1,99 @@
+"""PostgreSQL с проверкой постоянных соединений и необязательным пулом.
+
+CONN_HEALTH_CHECKS работает как в Django 4.1: переиспользуемое соединение
+проверяется перед первым запросом в рамках HTTP-запроса. Пул включается
+через OPTIONS['pool'] (min_size, max_size, timeout, max_idle), как
+в Django 5.1, и требует CONN_MAX_AGE = 0: в конце запроса соединение
+возвращается в пул, а не закрывается.
+"""
+import psycopg2
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from backend.instrumentation import timing
+
+from .pool import get_pool
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except psycopg2.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self._pool = None
+        self.pool_options = self.settings_dict['OPTIONS'].get('pool')
+        if self.pool_options and self.settings_dict['CONN_MAX_AGE']:
+            raise ImproperlyConfigured(
+                'Пул соединений работает только с CONN_MAX_AGE = 0.'
+            )
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    @property
+    def pool(self):
+        if self.pool_options and self._pool is None:
+            self._pool = get_pool(
+                self.alias, self.pool_options, self.check_pooled
+            )
+        return self._pool
+
+    def check_pooled(self, connection):
+        if connection.closed:
+            return False
+        return not self.health_check_enabled or is_usable(connection)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        with timing('db_connect'):
+            if self.pool is None:
+                return super().get_new_connection(conn_params)
+            connection = self.pool.getconn(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def _close(self):
+        if self.connection is not None and self.pool is not None:
+            with self.wrap_database_errors:
+                return self.pool.putconn(self.connection)
+        return super()._close()
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (self.connection is None or not self.health_check_enabled
+                or self.health_check_done):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+from psycopg2 import extensions
+
+from backend.instrumentation import register_collector
+
+# Пул на каждый alias из DATABASES, общий для всех потоков процесса.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """Пул соединений psycopg2 с ожиданием свободного соединения.
+
+    Открывает не больше max_size соединений; простаивающие дольше
+    max_idle секунд закрываются, пока их больше min_size.
+    """
+
+    def __init__(self, min_size, max_size, timeout, max_idle, check):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.size = 0
+        self.in_use = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def getconn(self, connect):
+        started = time.monotonic()
+        waited = False
+        with self.condition:
+            while True:
+                self.close_expired()
+                if self.idle:
+                    connection = self.idle.pop()[0]
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    connection = None
+                    break
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self.record_wait(started)
+                    raise PoolTimeout(
+                        f'Нет свободного соединения за {self.timeout} с.'
+                    )
+                waited = True
+                self.condition.wait(remaining)
+            self.in_use += 1
+            if waited:
+                self.record_wait(started)
+        if connection is not None and self.check(connection):
+            return connection
+        if connection is not None:
+            connection.close()
+        try:
+            return connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+
+    def record_wait(self, started):
+        self.waits += 1
+        self.wait_time += time.monotonic() - started
+
+    def putconn(self, connection):
+        if not connection.closed:
+            status = connection.info.transaction_status
+            if status in (extensions.TRANSACTION_STATUS_INTRANS,
+                          extensions.TRANSACTION_STATUS_INERROR):
+                connection.rollback()
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.close()
+        with self.condition:
+            self.in_use -= 1
+            if connection.closed:
+                self.size -= 1
+            else:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def close_expired(self):
+        deadline = time.monotonic() - self.max_idle
+        while (self.idle and self.size > self.min_size
+               and self.idle[0][1] < deadline):
+            self.idle.popleft()[0].close()
+            self.size -= 1
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'max_size': self.max_size,
+                'waits': self.waits,
+                'wait_seconds': self.wait_time,
+                'timeouts': self.timeouts,
+            }
+
+
+def get_pool(alias, options, check):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                min_size=options.get('min_size', 0),
+                max_size=options.get('max_size', 10),
+                timeout=options.get('timeout', 10),
+                max_idle=options.get('max_idle', 300),
+                check=check,
+            )
+        return _pools[alias]
+
+
+METRICS = (
+    ('size', 'gauge', 'Открытых соединений в пуле.'),
+    ('in_use', 'gauge', 'Соединений пула, занятых запросами.'),
+    ('idle', 'gauge', 'Свободных соединений в пуле.'),
+    ('max_size', 'gauge', 'Максимальный размер пула.'),
+    ('waits', 'counter', 'Сколько раз запрос ждал свободное соединение.'),
+    ('wait_seconds', 'counter', 'Суммарное время ожидания соединения.'),
+    ('timeouts', 'counter', 'Сколько раз соединение не дождались.'),
+)
+
+
+def render_metrics():
+    with _pools_lock:
+        stats = {alias: pool.stats() for alias, pool in _pools.items()}
+    lines = []
+    for name, kind, description in METRICS:
+        metric = f'foodgram_db_pool_{name}'
+        if kind == 'counter':
+            metric += '_total'
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        lines.extend(f'{metric}{{alias="{alias}"}} {values[name]}'
+                     for alias, values in sorted(stats.items()))
+    return lines
+
+
+register_collector(render_metrics)
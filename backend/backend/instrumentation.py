@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger('foodgram.performance')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Метрики одного запроса; экземпляр служит execute_wrapper для БД."""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = []
+        self.timings = defaultdict(float)
+        # В асинхронных view запросы одного HTTP-запроса идут из разных
+        # потоков, db_time тогда — сумма, а не время по часам.
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.db_time += elapsed
+                self.queries.append((sql, params, elapsed))
+
+    @property
+    def duplicates(self):
+        seen = {(sql, repr(params)) for sql, params, _ in self.queries}
+        return len(self.queries) - len(seen)
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def track_queries(metrics):
+    """Передаёт в metrics запросы всех соединений текущего потока."""
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        yield
+
+
+@contextmanager
+def timing(name):
+    """Добавляет время блока к метрике name текущего запроса."""
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.timings[name] += time.perf_counter() - started
+
+
+class Histogram:
+
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, route, value):
+        with self.lock:
+            counts, total = self.series.get(
+                route, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[route] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {route: (list(counts), total)
+                      for route, (counts, total) in self.series.items()}
+        for route, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{route="{route}",'
+                             f'le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{route="{route}"}} {total}')
+            lines.append(f'{self.name}_count{{route="{route}"}} {cumulative}')
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Полное время обработки запроса.', DURATION_BUCKETS
+)
+REQUEST_DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Время запросов к БД за один запрос.', DURATION_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_request_queries',
+    'Количество запросов к БД за один запрос.', QUERY_BUCKETS
+)
+HISTOGRAMS = [REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_QUERIES]
+# Функции, которые добавляют в /metrics свои строки, например пул БД.
+COLLECTORS = []
+
+
+def register_collector(collector):
+    COLLECTORS.append(collector)
+
+
+def get_route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def server_timing(total, metrics):
+    parts = [
+        f'total;dur={total * 1000:.1f}',
+        f'db;dur={metrics.db_time * 1000:.1f};'
+        f'desc="{len(metrics.queries)} queries"',
+    ]
+    parts.extend(f'{name};dur={value * 1000:.1f}'
+                 for name, value in metrics.timings.items())
+    return ', '.join(parts)
+
+
+class InstrumentationMiddleware:
+    """Время запроса, время и число запросов к БД, Server-Timing и лог.
+
+    Запросы дольше SLOW_REQUEST_THRESHOLD_MS пишутся в лог с уровнем
+    WARNING вместе со всем выполненным SQL.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_threshold = getattr(
+            settings, 'SLOW_REQUEST_THRESHOLD_MS', 500
+        ) / 1000
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: иначе Django посчитает middleware
+            # синхронным и будет гонять каждый запрос через поток.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with track_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(
+            request, response, metrics, time.perf_counter() - started
+        )
+
+    async def __acall__(self, request):
+        # Запросы к БД здесь выполняются в потоках, туда metrics попадают
+        # через контекст, см. api.async_views.database_sync_to_async.
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(
+            request, response, metrics, time.perf_counter() - started
+        )
+
+    def finish(self, request, response, metrics, total):
+        route = get_route(request)
+        REQUEST_DURATION.observe(route, total)
+        REQUEST_DB_DURATION.observe(route, metrics.db_time)
+        REQUEST_QUERIES.observe(route, len(metrics.queries))
+        response['Server-Timing'] = server_timing(total, metrics)
+
+        record = {
+            'route': route,
+            'method': request.method,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(metrics.db_time * 1000, 1),
+            'queries': len(metrics.queries),
+            'duplicate_queries': metrics.duplicates,
+        }
+        record.update({f'{name}_ms': round(value * 1000, 1)
+                       for name, value in metrics.timings.items()})
+        if total >= self.slow_threshold:
+            record['sql'] = [
+                {'sql': sql, 'params': repr(params),
+                 'ms': round(elapsed * 1000, 1)}
+                for sql, params, elapsed in metrics.queries
+            ]
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+def metrics_view(request):
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,7 +1,10 @@
 from django.urls import path, include
 from django.contrib import admin
 
+from .instrumentation import metrics_view
+
 urlpatterns = [
+    path('metrics', metrics_view),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls'))
 ]
@@ -1,17 +1,55 @@
+from collections import defaultdict
+
 from django.contrib import admin
 
 from .models import (Tag, Recipe, Ingredient, Cart, Favorite, Follow,
-                     RecipeIngredient, RecipeTag)
+                     RecipeIngredient, RecipeTag, AuthorStats,
+                     ShoppingListItem)
+from .shopping_list import sync_recipe
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'favorites_count')
     list_filter = ('author', 'name', 'tags')
+    list_select_related = ('author',)
+
+
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    """У RecipeIngredient нет сигналов, списки покупок тех, у кого рецепт
+    в корзине, обновляются здесь."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        ingredients = {obj.ingredient_id, form.initial.get('ingredient')}
+        for recipe_id in {obj.recipe_id, form.initial.get('recipe')}:
+            if recipe_id is not None:
+                sync_recipe(recipe_id, list(ingredients - {None}))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        sync_recipe(obj.recipe_id, [obj.ingredient_id])
+
+    def delete_queryset(self, request, queryset):
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in queryset.values_list(
+            'recipe_id', 'ingredient_id'
+        ):
+            ingredients[recipe_id].append(ingredient_id)
+        super().delete_queryset(request, queryset)
+        for recipe_id, ingredient_ids in ingredients.items():
+            sync_recipe(recipe_id, ingredient_ids)
+
+
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count', 'followers_count')
+    readonly_fields = ('user', 'recipes_count', 'followers_count')
+    list_select_related = ('user',)
 
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
 
-    favorite_count.short_description = 'Добавлений в избранное'
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount')
+    readonly_fields = ('user', 'ingredient', 'total_amount')
+    list_select_related = ('user', 'ingredient')
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -25,5 +63,7 @@ admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Favorite)
 admin.site.register(Cart)
 admin.site.register(Follow)
-admin.site.register(RecipeIngredient)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(RecipeTag)
+admin.site.register(AuthorStats, AuthorStatsAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
@@ -0,0 +1,105 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.dispatch import Signal
+from PIL import Image, features
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZES = {
+    'thumbnail': (400, 400),
+    'medium': (1000, 1000),
+}
+VARIANTS_DIR = 'foodgram/images/variants'
+VARIANT_FORMAT, VARIANT_EXTENSION = (
+    ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+)
+
+# Отправляется, когда у рецепта готовы уменьшенные копии картинки.
+variants_ready = Signal()
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+    thread_name_prefix='recipe-images'
+)
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size)
+    if VARIANT_FORMAT == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    buffer = io.BytesIO()
+    variant.save(buffer, VARIANT_FORMAT, quality=80)
+    return buffer.getvalue()
+
+
+def make_variants(recipe_id, image_name):
+    try:
+        with default_storage.open(image_name) as file:
+            image = Image.open(file)
+            image.load()
+        stem = PurePosixPath(image_name).stem
+        variants = {}
+        for size_name, size in IMAGE_SIZES.items():
+            variants[size_name] = default_storage.save(
+                f'{VARIANTS_DIR}/{stem}_{size_name}.{VARIANT_EXTENSION}',
+                ContentFile(render_variant(image, size))
+            )
+        # Картинку могли заменить или рецепт удалить, пока шла обработка:
+        # тогда обновление ничего не затронет, а копии уже не нужны.
+        if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            image_variants=variants
+        ):
+            variants_ready.send(sender=Recipe, recipe_id=recipe_id)
+        else:
+            delete_files(variants.values())
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', image_name)
+    finally:
+        connection.close()
+
+
+def delete_files(names):
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except Exception:
+            logger.exception('Не удалось удалить файл %s', name)
+
+
+def delete_images(image_name, variants):
+    """Удаляет файлы картинки и её уменьшенных копий после коммита."""
+    names = [name for name in (image_name, *variants.values()) if name]
+    if names:
+        transaction.on_commit(
+            lambda: _executor.submit(delete_files, names)
+        )
+
+
+def schedule_variants(recipe):
+    if not recipe.image:
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: _executor.submit(make_variants, recipe_id, image_name)
+    )
+
+
+def variant_urls(recipe):
+    if not recipe.image:
+        return {}
+    return {
+        size_name: default_storage.url(
+            recipe.image_variants.get(size_name, recipe.image.name)
+        )
+        for size_name in IMAGE_SIZES
+    }
@@ -0,0 +1,428 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+import requests
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from foodgram.management.commands.generate_benchmark_data import (
+    USERNAME_PREFIX, TAGS)
+from foodgram.models import Ingredient, Recipe, RecipeIngredient
+
+BASELINE_DIR = Path(settings.BASE_DIR) / 'benchmarks'
+# Время ответа зависит от машины, поэтому его базовый замер не попадает
+# в репозиторий, а в репозитории лежит только число запросов к БД.
+LOCAL_BASELINE_DIR = BASELINE_DIR / 'local'
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def recipes(rng, data):
+    return f'/api/recipes/?page={rng.randint(1, 5)}&limit=6'
+
+
+def recipes_filtered(rng, data):
+    return (f'/api/recipes/?tags={rng.choice(data["tags"])}'
+            f'&is_favorited=1&limit=6')
+
+
+def recipes_trending(rng, data):
+    return (f'/api/recipes/?ordering=trending&page={rng.randint(1, 5)}'
+            f'&limit=6')
+
+
+def recipe_detail(rng, data):
+    return f'/api/recipes/{rng.choice(data["recipes"])}/'
+
+
+def similar(rng, data):
+    return f'/api/recipes/{rng.choice(data["recipes"])}/similar/'
+
+
+def pantry(rng, data):
+    ingredients = rng.sample(data['ingredients'],
+                             min(8, len(data['ingredients'])))
+    return (f'/api/recipes/pantry/?ingredients='
+            f'{",".join(map(str, ingredients))}&limit=6')
+
+
+def subscriptions(rng, data):
+    return '/api/users/subscriptions/?recipes_limit=3'
+
+
+def shopping_cart(rng, data):
+    return '/api/recipes/download_shopping_cart/'
+
+
+def autocomplete(rng, data):
+    return f'/api/ingredients/?name={quote(rng.choice(data["prefixes"]))}'
+
+
+SCENARIOS = {
+    'recipes': recipes,
+    'recipes-filtered': recipes_filtered,
+    'recipes-trending': recipes_trending,
+    'recipe-detail': recipe_detail,
+    'similar': similar,
+    'pantry': pantry,
+    'subscriptions': subscriptions,
+    'shopping-cart': shopping_cart,
+    'autocomplete': autocomplete,
+}
+
+
+class LocalClient:
+    """Запросы через WSGI-обработчик Django в этом же процессе."""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get(self, path, token):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(
+                HTTP_HOST='localhost', raise_request_exception=False
+            )
+        response = client.get(path, HTTP_AUTHORIZATION=f'Token {token}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, response.get('Server-Timing', '')
+
+
+class HttpClient:
+    """Запросы к запущенному серверу по HTTP."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.local = threading.local()
+
+    def get(self, path, token):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        response = session.get(
+            self.url + path, headers={'Authorization': f'Token {token}'}
+        )
+        return response.status_code, response.headers.get('Server-Timing', '')
+
+
+class AsgiClient:
+    """Запросы к ASGI-приложению в этом же процессе.
+
+    Все запросы идут из одного цикла событий, как у одного воркера
+    uvicorn, поэтому --concurrency здесь — число одновременных
+    соединений на воркер.
+    """
+
+    def __init__(self):
+        self.application = ASGIHandler()
+
+    async def get(self, path, token):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [
+                (b'host', b'localhost'),
+                (b'authorization', f'Token {token}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        response = {}
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {
+                    name.lower(): value for name, value in message['headers']
+                }
+
+        await self.application(scope, receive, send)
+        return response['status'], response['headers'].get(
+            b'server-timing', b''
+        ).decode()
+
+
+def make_sample(started, status, server_timing):
+    duration = (time.perf_counter() - started) * 1000
+    match = QUERIES_RE.search(server_timing)
+    return duration, status, int(match[1]) if match else None
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples, elapsed):
+    durations = [duration for duration, _, _ in samples]
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'rps': round(len(samples) / elapsed, 1),
+        'p50': round(percentile(durations, 50), 2),
+        'p95': round(percentile(durations, 95), 2),
+        'p99': round(percentile(durations, 99), 2),
+        'queries': (round(sum(queries) / len(queries), 2)
+                    if queries else None),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест основных эндпоинтов API на данных '
+            'generate_benchmark_data: p50/p95/p99 и запросы к БД '
+            'на запрос, сравнение с сохранённым базовым замером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера. Без него запросы идут '
+                 'в этом же процессе.'
+        )
+        parser.add_argument(
+            '--asgi', action='store_true',
+            help='Гонять запросы через ASGI-приложение в одном цикле '
+                 'событий. Нужен ASYNC_VIEWS=1.'
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый сценарий.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Запросов на сценарий до начала замера.'
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=list(SCENARIOS),
+            help='Запустить только эти сценарии.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--baseline',
+            help='Файл базового замера времени ответа, снятого на этой же '
+                 'машине. По умолчанию '
+                 'benchmarks/local/baseline_<vendor>[_asgi].json.'
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результат как новый базовый замер этой машины.'
+        )
+        parser.add_argument(
+            '--queries',
+            help='Файл с числом запросов к БД и ошибок по сценариям. '
+                 'По умолчанию benchmarks/queries_<vendor>[_asgi].json.'
+        )
+        parser.add_argument(
+            '--save-queries', action='store_true',
+            help='Записать число запросов к БД и ошибок по сценариям.'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95 относительно базового замера.'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency и --requests должны быть '
+                               'больше нуля.')
+        rng = random.Random(options['seed'])
+        data = self.load_data(rng)
+        if options['asgi'] and not settings.ASYNC_VIEWS:
+            raise CommandError('Для --asgi запустите команду с ASYNC_VIEWS=1.')
+        if options['url']:
+            client = HttpClient(options['url'])
+        elif options['asgi']:
+            client = AsgiClient()
+        else:
+            client = LocalClient()
+        if not options['url'] and options['verbosity'] < 2:
+            # Иначе медленные под нагрузкой запросы засыпят вывод SQL.
+            logging.getLogger('foodgram.performance').setLevel(logging.ERROR)
+        results = {}
+        for name in options['scenario'] or SCENARIOS:
+            plan = [
+                (SCENARIOS[name](rng, data), rng.choice(data['tokens']))
+                for _ in range(options['warmup'] + options['requests'])
+            ]
+            run = self.run_async if options['asgi'] else self.run
+            results[name] = run(client, plan, options)
+            self.report(name, results[name])
+
+        mode = '_asgi' if options['asgi'] else ''
+        regressions = []
+        path = Path(options['queries'] or BASELINE_DIR
+                    / f'queries_{connection.vendor}{mode}.json')
+        if options['save_queries']:
+            self.save(path, {
+                'vendor': connection.vendor,
+                'scenarios': {
+                    name: {
+                        'queries': result['queries'],
+                        'errors': result['errors'],
+                    }
+                    for name, result in results.items()
+                },
+            })
+        elif path.exists():
+            regressions += self.compare_queries(
+                results, json.loads(path.read_text())
+            )
+        else:
+            self.stdout.write(f'Файла {path} нет, сравнение числа запросов '
+                              f'пропущено.')
+
+        path = Path(options['baseline'] or LOCAL_BASELINE_DIR
+                    / f'baseline_{connection.vendor}{mode}.json')
+        if options['save_baseline']:
+            self.save(path, {
+                'vendor': connection.vendor,
+                'concurrency': options['concurrency'],
+                'scenarios': results,
+            })
+        elif path.exists():
+            regressions += self.compare_timing(
+                results, json.loads(path.read_text()), options
+            )
+        else:
+            self.stdout.write(f'Базового замера {path} нет, сравнение '
+                              f'времени пропущено. Снимите его на этой '
+                              f'машине с --save-baseline.')
+        if regressions:
+            raise CommandError('Регрессия: ' + '; '.join(regressions))
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def save(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(data, indent=2, ensure_ascii=False) + '\n'
+        )
+        self.stdout.write(f'Сохранено в {path}.')
+
+    def load_data(self, rng):
+        tokens = list(Token.objects.filter(
+            user__username__startswith=USERNAME_PREFIX
+        ).order_by('user_id').values_list('key', flat=True))
+        if not tokens:
+            raise CommandError('Нет данных для бенчмарка, сначала '
+                               'запустите generate_benchmark_data.')
+        names = list(Ingredient.objects.order_by('pk').values_list(
+            'name', flat=True
+        ))
+        return {
+            'tokens': tokens,
+            'recipes': list(Recipe.objects.filter(
+                author__username__startswith=USERNAME_PREFIX
+            ).order_by('pk').values_list('pk', flat=True)),
+            'tags': [slug for _, _, slug in TAGS],
+            'ingredients': list(RecipeIngredient.objects.filter(
+                recipe__author__username__startswith=USERNAME_PREFIX
+            ).order_by('ingredient').values_list(
+                'ingredient', flat=True
+            ).distinct()),
+            'prefixes': sorted({
+                name[:3] for name in rng.sample(names, min(100, len(names)))
+            }),
+        }
+
+    def run(self, client, plan, options):
+        def fetch(item):
+            started = time.perf_counter()
+            return make_sample(started, *client.get(*item))
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            list(executor.map(fetch, plan[:options['warmup']]))
+            started = time.perf_counter()
+            samples = list(executor.map(fetch, plan[options['warmup']:]))
+            elapsed = time.perf_counter() - started
+        return summarize(samples, elapsed)
+
+    def run_async(self, client, plan, options):
+        async def run_all():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+
+            async def fetch(item):
+                async with semaphore:
+                    started = time.perf_counter()
+                    return make_sample(started, *await client.get(*item))
+
+            await asyncio.gather(*map(fetch, plan[:options['warmup']]))
+            started = time.perf_counter()
+            samples = await asyncio.gather(
+                *map(fetch, plan[options['warmup']:])
+            )
+            return samples, time.perf_counter() - started
+
+        return summarize(*asyncio.run(run_all()))
+
+    def report(self, name, result):
+        queries = result['queries']
+        self.stdout.write(
+            f'{name:>17}: p50 {result["p50"]:7.1f}  p95 {result["p95"]:7.1f}'
+            f'  p99 {result["p99"]:7.1f} мс  {result["rps"]:7.1f} rps  '
+            f'запросов к БД {"-" if queries is None else queries}  '
+            f'ошибок {result["errors"]}'
+        )
+
+    def compare_queries(self, results, expected):
+        regressions = []
+        for name, result in results.items():
+            base = expected['scenarios'].get(name)
+            if base is None:
+                self.stdout.write(f'{name:>17}: нет в файле запросов.')
+                continue
+            self.stdout.write(
+                f'{name:>17}: запросов к БД {base["queries"]} -> '
+                f'{result["queries"]}'
+            )
+            if (result['queries'] is not None and base['queries'] is not None
+                    and result['queries'] > base['queries'] + 0.5):
+                regressions.append(
+                    f'{name}: запросов к БД {base["queries"]} -> '
+                    f'{result["queries"]}'
+                )
+            if result['errors'] > base['errors']:
+                regressions.append(f'{name}: ошибок {result["errors"]}')
+        return regressions
+
+    def compare_timing(self, results, baseline, options):
+        if baseline.get('concurrency') != options['concurrency']:
+            self.stdout.write(self.style.WARNING(
+                f'Базовый замер снят с --concurrency '
+                f'{baseline.get("concurrency")}.'
+            ))
+        regressions = []
+        for name, result in results.items():
+            base = baseline['scenarios'].get(name)
+            if base is None:
+                continue
+            change = (result['p95'] / base['p95'] - 1) if base['p95'] else 0
+            self.stdout.write(
+                f'{name:>17}: p95 {change:+.0%} к базовому замеру'
+            )
+            if change > options['tolerance']:
+                regressions.append(f'{name}: p95 {change:+.0%}')
+        return regressions
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from foodgram.models import Recipe
+from foodgram.search import search_recipes
+
+
+def measure(queryset, repeat, limit):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows = list(queryset.values_list('pk', flat=True)[:limit])
+    return (time.perf_counter() - started) / repeat * 1000, len(rows)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает полнотекстовый поиск рецептов с поиском '
+            'через icontains.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('query', help='Строка поиска.')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Показать планы обоих запросов.'
+        )
+
+    def handle(self, *args, query, repeat, limit, explain, **options):
+        text = search_recipes(Recipe.objects.all(), query)
+        icontains = Recipe.objects.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(ingredients__name__icontains=query)
+        ).distinct()
+        for title, queryset in (('search', text), ('icontains', icontains)):
+            elapsed, found = measure(queryset, repeat, limit)
+            self.stdout.write(
+                f'{title:>10}: {elapsed:.2f} мс на запрос, '
+                f'найдено {found} (первые {limit})'
+            )
+            if explain:
+                self.stdout.write(queryset[:limit].explain())
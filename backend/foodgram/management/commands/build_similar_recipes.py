@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from foodgram.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = ('Считает похожие рецепты для /api/recipes/<id>/similar/. '
+            'По умолчанию только для рецептов, изменённых после прошлого '
+            'запуска, и тех, чьи списки они задевают.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать соседей всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = build_similar_recipes(timezone.now(), options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {count} '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
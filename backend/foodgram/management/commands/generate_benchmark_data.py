@@ -0,0 +1,179 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from foodgram.management.commands.load_ingredients import DEFAULT_PATH
+from foodgram.models import (Cart, Favorite, Follow, Ingredient, Recipe,
+                             RecipeIngredient, RecipeTag, Tag)
+from foodgram.search import is_supported, update_search_vectors
+
+User = get_user_model()
+
+USERNAME_PREFIX = 'bench-user-'
+PASSWORD = 'bench-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BATCH_SIZE = 1000
+
+
+def bench_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX)
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, рецепты, подписки, '
+            'избранное и списки покупок для benchmark_api.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=10,
+            help='Рецептов у каждого пользователя.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Ингредиентов в каждом рецепте.'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Подписок у каждого пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном у каждого пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в списке покупок у каждого пользователя.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--ingredients-path', default=str(DEFAULT_PATH),
+            help='Откуда загрузить ингредиенты, если их ещё нет в базе.'
+        )
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Удалить данные предыдущего запуска.'
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('--users должен быть не меньше 2.')
+        if bench_users().exists():
+            if not options['flush']:
+                raise CommandError('Данные для бенчмарка уже есть, '
+                                   'запустите с --flush.')
+            bench_users().delete()
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', options['ingredients_path'],
+                         stdout=self.stdout)
+
+        started = time.monotonic()
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(rng, users, options)
+            self.create_relations(rng, users, recipes, options)
+        if is_supported():
+            update_search_vectors(Recipe.objects.filter(author__in=users))
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        call_command('refresh_recipe_scores', stdout=self.stdout)
+        call_command('build_similar_recipes', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(users)}, рецептов: {len(recipes)} '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(
+                username=f'{USERNAME_PREFIX}{number}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name='Бенчмарк',
+                last_name=str(number),
+                password=password,
+            )
+            for number in range(count)
+        ], batch_size=BATCH_SIZE)
+        users = list(bench_users().order_by('pk'))
+        Token.objects.bulk_create([
+            Token(user=user, key=Token.generate_key()) for user in users
+        ], batch_size=BATCH_SIZE)
+        return users
+
+    def create_recipes(self, rng, users, options):
+        tags = [
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )[0]
+            for name, color, slug in TAGS
+        ]
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        per_recipe = min(options['ingredients'], len(ingredient_ids))
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=user,
+                name=f'Рецепт {number}',
+                text='Синтетический рецепт для нагрузочного теста.',
+                cooking_time=rng.randint(5, 120),
+            )
+            for user in users
+            for number in range(options['recipes'])
+        ], batch_size=BATCH_SIZE)
+        recipes = list(
+            Recipe.objects.filter(author__in=users).values_list(
+                'pk', flat=True
+            )
+        )
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500),
+            )
+            for recipe_id in recipes
+            for ingredient_id in rng.sample(ingredient_ids, per_recipe)
+        ], batch_size=BATCH_SIZE)
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe_id=recipe_id, tag=tag)
+            for recipe_id in recipes
+            for tag in rng.sample(tags, rng.randint(1, len(tags)))
+        ], batch_size=BATCH_SIZE)
+        return recipes
+
+    def create_relations(self, rng, users, recipes, options):
+        follows, favorites, carts = [], [], []
+        for user in users:
+            others = [other for other in users if other.pk != user.pk]
+            follows.extend(
+                Follow(user=user, following=other)
+                for other in rng.sample(
+                    others, min(options['follows'], len(others))
+                )
+            )
+            favorites.extend(
+                Favorite(user=user, recipe_id=recipe_id)
+                for recipe_id in rng.sample(
+                    recipes, min(options['favorites'], len(recipes))
+                )
+            )
+            carts.extend(
+                Cart(user=user, recipe_id=recipe_id)
+                for recipe_id in rng.sample(
+                    recipes, min(options['carts'], len(recipes))
+                )
+            )
+        for model, objects in ((Follow, follows), (Favorite, favorites),
+                               (Cart, carts)):
+            model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
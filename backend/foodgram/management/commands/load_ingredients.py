@@ -0,0 +1,136 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodgram.models import Ingredient
+from foodgram.signals import bump_ingredients_version
+
+DEFAULT_PATH = Path(settings.BASE_DIR).parent / 'data' / 'ingredients.csv'
+DEFAULT_BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) >= 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON. Повторный запуск '
+            'безопасен: уже существующие пары (название, единица '
+            'измерения) пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Файл ingredients.csv или ingredients.json.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Сколько строк обрабатывать за один запрос.'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден.')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        load_chunk = self.copy_chunk if use_copy else self.insert_chunk
+
+        started = time.monotonic()
+        seen = set()
+        read = created = 0
+        with transaction.atomic():
+            for chunk in chunked(reader(path), batch_size):
+                read += len(chunk)
+                rows = [row for row in dict.fromkeys(chunk)
+                        if row not in seen]
+                seen.update(rows)
+                created += load_chunk(rows, batch_size)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Прочитано {read}, добавлено {created}, '
+                    f'{read / elapsed if elapsed else read:.0f} строк/с'
+                )
+        if created:
+            bump_ingredients_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: добавлено {created} ингредиентов из {read} строк '
+            f'за {time.monotonic() - started:.2f} с.'
+        ))
+
+    def insert_chunk(self, rows, batch_size):
+        names = {name for name, _ in rows}
+        existing = set(Ingredient.objects.filter(
+            name__in=names
+        ).values_list('name', 'measurement_unit'))
+        new = [Ingredient(name=name, measurement_unit=unit)
+               for name, unit in rows if (name, unit) not in existing]
+        Ingredient.objects.bulk_create(
+            new, batch_size=batch_size, ignore_conflicts=True
+        )
+        return len(new)
+
+    def copy_chunk(self, rows, batch_size):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredients_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.execute('TRUNCATE ingredients_import')
+            cursor.copy_expert(
+                'COPY ingredients_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredients_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return cursor.rowcount
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.shopping_list import sync_shopping_lists
+
+User = get_user_model()
+USERS_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает списки покупок пользователей из их корзин '
+            'и состава рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки покупок, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        check = options['check']
+        user_ids = list(User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        ))
+        mismatched = 0
+        for start in range(0, len(user_ids), USERS_BATCH_SIZE):
+            mismatched += sync_shopping_lists(
+                user_ids[start:start + USERS_BATCH_SIZE], check=check
+            )
+        if check and mismatched:
+            raise CommandError(
+                f'Расхождений в списках покупок: {mismatched}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено строк списков покупок: {mismatched}' if not check
+            else 'Списки покупок совпадают с корзинами.'
+        ))
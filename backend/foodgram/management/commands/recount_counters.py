@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.models import AuthorStats, Cart, Favorite, Follow, Recipe
+from foodgram.signals import count_subquery
+
+User = get_user_model()
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного, списков покупок, '
+            'рецептов и подписчиков.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        check = options['check']
+        with transaction.atomic():
+            mismatched = (self.recount_recipes(check)
+                          + self.recount_authors(check))
+        if check and mismatched:
+            raise CommandError(f'Расхождений в счётчиках: {mismatched}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {mismatched}' if not check
+            else 'Счётчики совпадают с данными.'
+        ))
+
+    def recount_recipes(self, check):
+        recipes = Recipe.objects.annotate(
+            actual_favorites=count_subquery(Favorite.objects, 'recipe'),
+            actual_cart=count_subquery(Cart.objects, 'recipe'),
+        ).only('pk', 'favorites_count', 'cart_count')
+        changed = []
+        for recipe in recipes.iterator(chunk_size=BATCH_SIZE):
+            if (recipe.favorites_count, recipe.cart_count) == (
+                recipe.actual_favorites, recipe.actual_cart
+            ):
+                continue
+            recipe.favorites_count = recipe.actual_favorites
+            recipe.cart_count = recipe.actual_cart
+            changed.append(recipe)
+        if not check:
+            Recipe.objects.bulk_update(
+                changed, ('favorites_count', 'cart_count'),
+                batch_size=BATCH_SIZE
+            )
+        return len(changed)
+
+    def recount_authors(self, check):
+        users = User.objects.annotate(
+            actual_recipes=count_subquery(Recipe.objects, 'author'),
+            actual_followers=count_subquery(Follow.objects, 'following'),
+        ).select_related('stats').only(
+            'pk', 'stats__recipes_count', 'stats__followers_count'
+        )
+        changed, created = [], []
+        for user in users.iterator(chunk_size=BATCH_SIZE):
+            stats = getattr(user, 'stats', None)
+            actual = (user.actual_recipes, user.actual_followers)
+            if stats is None and actual == (0, 0):
+                continue
+            if stats is None:
+                created.append(AuthorStats(
+                    user=user,
+                    recipes_count=user.actual_recipes,
+                    followers_count=user.actual_followers
+                ))
+                continue
+            if (stats.recipes_count, stats.followers_count) == actual:
+                continue
+            stats.recipes_count, stats.followers_count = actual
+            changed.append(stats)
+        if not check:
+            AuthorStats.objects.bulk_create(created, batch_size=BATCH_SIZE)
+            AuthorStats.objects.bulk_update(
+                changed, ('recipes_count', 'followers_count'),
+                batch_size=BATCH_SIZE
+            )
+        return len(changed) + len(created)
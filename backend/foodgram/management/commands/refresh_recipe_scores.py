@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.ranking import (TRENDING_HALF_LIFE, TRENDING_WINDOW,
+                              refresh_popularity, refresh_trending)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает популярность рецептов для ordering=popular '
+            'и ordering=trending. Запускается по расписанию, например '
+            'раз в несколько минут из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window-hours', type=int,
+            default=int(TRENDING_WINDOW / timedelta(hours=1)),
+            help='За сколько последних часов учитывать добавления.'
+        )
+        parser.add_argument(
+            '--half-life-hours', type=float,
+            default=TRENDING_HALF_LIFE / timedelta(hours=1),
+            help='За сколько часов вклад добавления падает вдвое.'
+        )
+
+    def handle(self, *args, **options):
+        if options['window_hours'] < 1 or options['half_life_hours'] <= 0:
+            raise CommandError('--window-hours и --half-life-hours должны '
+                               'быть больше нуля.')
+        popular = refresh_popularity()
+        trending = refresh_trending(
+            window=timedelta(hours=options['window_hours']),
+            half_life=timedelta(hours=options['half_life_hours'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: popular {popular}, trending {trending}.'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.models import Recipe
+from foodgram.search import is_supported, update_search_vectors
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы всех рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько рецептов обновлять одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            raise CommandError('Полнотекстовый поиск работает только '
+                               'на PostgreSQL.')
+        batch_size = options['batch_size']
+        last_id = updated = 0
+        while True:
+            ids = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+                'pk'
+            ).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            updated += update_search_vectors(
+                Recipe.objects.filter(pk__in=ids)
+            )
+            last_id = ids[-1]
+            self.stdout.write(f'Обновлено рецептов: {updated}')
+        self.stdout.write(self.style.SUCCESS('Готово.'))
@@ -1,5 +1,7 @@
 from typing import Optional
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.contrib.auth import get_user_model
@@ -31,7 +33,7 @@ class Tag(models.Model):
 
 
 class Ingredient(models.Model):
-    name = models.CharField(max_length=50, verbose_name='Название')
+    name = models.CharField(max_length=200, verbose_name='Название')
     measurement_unit = models.CharField(
         max_length=200, verbose_name='Единица измерения'
     )
@@ -39,6 +41,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -46,6 +54,32 @@ class Ingredient(models.Model):
 
 class RecipeQuerySet(models.QuerySet):
 
+    def with_related(self, user_id: Optional[int] = None):
+        return self.prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            models.Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=models.Exists(
+                        Follow.objects.filter(
+                            user_id=user_id, following=models.OuterRef('pk')
+                        )
+                    )
+                )
+            )
+        )
+
+    def latest_per_author(self, limit: int):
+        return self.filter(pk__in=models.Subquery(
+            Recipe.objects.filter(
+                author=models.OuterRef('author')
+            ).order_by('-pub_date', '-id').values('pk')[:limit]
+        ))
+
     def add_user_annotations(self, user_id: Optional[int]):
         return self.annotate(
             in_shopping_cart=models.Exists(
@@ -57,6 +91,11 @@ class RecipeQuerySet(models.QuerySet):
                 Favorite.objects.filter(
                     user_id=user_id, recipe__pk=models.OuterRef('pk')
                 )
+            ),
+            author_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user_id=user_id, following=models.OuterRef('author')
+                )
             )
         )
 
@@ -87,17 +126,75 @@ class Recipe(models.Model):
         default=None,
         verbose_name='Картинка'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки'
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         db_index=True,
         verbose_name='Время публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Время изменения'
+    )
+    similar_updated = models.DateTimeField(
+        null=True,
+        editable=False,
+        verbose_name='Время расчёта похожих рецептов'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Добавлений в избранное'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок'
+    )
+    popularity = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность'
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Популярность за последние дни'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=('pub_date', 'id'), name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', 'pub_date', 'id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('popularity', 'id'), name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=('trending_score', 'id'), name='recipe_trending_idx'
+            ),
+            GinIndex(
+                fields=('search_vector',), name='recipe_search_vector_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=('author', 'name'),
@@ -122,6 +219,11 @@ class Cart(models.Model):
         related_name='cart',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время добавления'
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -176,6 +278,11 @@ class RecipeTag(models.Model):
     class Meta:
         verbose_name = 'Тег в рецепте'
         verbose_name_plural = 'Теги в рецептах'
+        indexes = [
+            models.Index(
+                fields=('tag', 'recipe'), name='recipetag_tag_recipe_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.tag} в {self.recipe}'
@@ -192,6 +299,11 @@ class Favorite(models.Model):
         related_name='favorites',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -234,3 +346,94 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.following}'
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0, verbose_name='Рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name='Подписчиков'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class ShoppingListItem(models.Model):
+    """Сумма ингредиента по всем рецептам в списке покупок пользователя.
+
+    Поддерживается сигналами при изменении корзины и состава рецептов,
+    сверяется и пересобирается командой rebuild_shopping_lists.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}'
+
+
+class SimilarRecipe(models.Model):
+    """Похожий рецепт из top-k, которые считает build_similar_recipes."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        indexes = [
+            models.Index(
+                fields=('recipe', '-score'), name='similar_recipe_score_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
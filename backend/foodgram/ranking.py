@@ -0,0 +1,83 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import (Count, Exists, ExpressionWrapper, F,
+                              FloatField, OuterRef, Q)
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Cart, Favorite, Recipe
+
+FAVORITE_WEIGHT = 1.0
+CART_WEIGHT = 2.0
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_HALF_LIFE = timedelta(hours=24)
+BATCH_SIZE = 1000
+
+
+def popularity_expression():
+    return ExpressionWrapper(
+        F('favorites_count') * FAVORITE_WEIGHT + F('cart_count') * CART_WEIGHT,
+        output_field=FloatField()
+    )
+
+
+def refresh_popularity():
+    """Пересчитывает popularity по счётчикам одним UPDATE.
+
+    Перезаписываются только рецепты, у которых счётчики изменились.
+    """
+    expression = popularity_expression()
+    return Recipe.objects.exclude(popularity=expression).update(
+        popularity=expression
+    )
+
+
+def trending_scores(now, window=TRENDING_WINDOW,
+                    half_life=TRENDING_HALF_LIFE):
+    """Затухающая сумма добавлений в избранное и корзину за окно.
+
+    Добавления считаются по часам, вклад часа падает вдвое
+    за каждый half_life.
+    """
+    scores = defaultdict(float)
+    for model, weight in ((Favorite, FAVORITE_WEIGHT), (Cart, CART_WEIGHT)):
+        rows = model.objects.filter(created__gte=now - window).annotate(
+            hour=TruncHour('created')
+        ).values('recipe', 'hour').annotate(added=Count('pk')).order_by()
+        for row in rows:
+            age = max(now - row['hour'], timedelta())
+            scores[row['recipe']] += (
+                weight * row['added'] * 0.5 ** (age / half_life)
+            )
+    return scores
+
+
+def refresh_trending(now=None, window=TRENDING_WINDOW,
+                     half_life=TRENDING_HALF_LIFE):
+    """Обновляет trending_score рецептов, которых касается окно.
+
+    Это рецепты с добавлениями за окно и рецепты, у которых оценка ещё
+    не обнулилась. Возвращает число изменённых рецептов.
+    """
+    now = now or timezone.now()
+    scores = trending_scores(now, window, half_life)
+    since = now - window
+    current = dict(Recipe.objects.filter(
+        Exists(Favorite.objects.filter(
+            recipe=OuterRef('pk'), created__gte=since
+        ))
+        | Exists(Cart.objects.filter(
+            recipe=OuterRef('pk'), created__gte=since
+        ))
+        | Q(trending_score__gt=0)
+    ).values_list('pk', 'trending_score'))
+    changed = []
+    for pk, previous in current.items():
+        score = round(scores.get(pk, 0.0), 6)
+        if score != previous:
+            changed.append(Recipe(pk=pk, trending_score=score))
+    Recipe.objects.bulk_update(
+        changed, ('trending_score',), batch_size=BATCH_SIZE
+    )
+    return len(changed)
@@ -0,0 +1,53 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q, Subquery
+
+from .models import RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def recipe_search_vector():
+    ingredient_names = Subquery(
+        RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Пересчитывает search_vector рецептов одним UPDATE.
+
+    На других СУБД search_vector не используется и не заполняется.
+    """
+    if not is_supported():
+        return 0
+    return recipes.update(search_vector=recipe_search_vector())
+
+
+def search_recipes(recipes, text):
+    if not is_supported():
+        return recipes.filter(
+            Q(name__icontains=text)
+            | Q(text__icontains=text)
+            | Exists(RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient__name__icontains=text
+            ))
+        )
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return recipes.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-pub_date')
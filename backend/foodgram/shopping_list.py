@@ -0,0 +1,130 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Cart, RecipeIngredient, ShoppingListItem
+
+User = get_user_model()
+BATCH_SIZE = 1000
+
+_pending = threading.local()
+
+
+def version_key(user_id):
+    return f'shopping-list-version:{user_id}'
+
+
+def get_version(user_id):
+    """Версия списка покупок пользователя для ETag.
+
+    Пропавший из кеша ключ заводится заново от текущего времени, а не
+    с нуля, чтобы не повторить ETag одной из прошлых версий.
+    """
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def bump_versions(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            cache.set(version_key(user_id), time.time_ns(), None)
+
+
+def sync_shopping_lists(users, ingredients=None, check=False):
+    """Приводит ShoppingListItem пользователей users к их корзинам.
+
+    users и ingredients — списки id или подзапросы; без ingredients
+    сверяются списки целиком. Пересчёт идемпотентный, поэтому его можно
+    вызывать из сигналов в любом порядке каскадного удаления. Версии
+    изменённых списков поднимаются после коммита. Возвращает число
+    расходившихся строк, с check=True ничего не меняет.
+    """
+    recipe_ingredients = RecipeIngredient.objects.filter(
+        recipe__cart__user__in=users
+    )
+    items = ShoppingListItem.objects.filter(user__in=users)
+    if ingredients is not None:
+        recipe_ingredients = recipe_ingredients.filter(
+            ingredient__in=ingredients
+        )
+        items = items.filter(ingredient__in=ingredients)
+    with transaction.atomic():
+        if not check:
+            # Пересчёты одного пользователя идут по очереди, иначе
+            # параллельные запросы перезапишут суммы друг друга.
+            list(User.objects.select_for_update(no_key=True).filter(
+                pk__in=users
+            ).order_by('pk').values_list('pk', flat=True))
+        actual = {
+            (row['recipe__cart__user'], row['ingredient']): row['total']
+            for row in recipe_ingredients.values(
+                'recipe__cart__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+        changed, removed = [], []
+        for item in items:
+            total = actual.pop((item.user_id, item.ingredient_id), None)
+            if total is None:
+                removed.append(item)
+            elif total != item.total_amount:
+                item.total_amount = total
+                changed.append(item)
+        created = [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id,
+                total_amount=total
+            )
+            for (user_id, ingredient_id), total in actual.items()
+        ]
+        if not check:
+            ShoppingListItem.objects.filter(
+                pk__in=[item.pk for item in removed]
+            ).delete()
+            ShoppingListItem.objects.bulk_update(
+                changed, ('total_amount',), batch_size=BATCH_SIZE
+            )
+            ShoppingListItem.objects.bulk_create(
+                created, batch_size=BATCH_SIZE
+            )
+            # Версия поднимается после коммита, иначе параллельный запрос
+            # успеет отдать старый список уже с новым ETag.
+            touched = {item.user_id for item in (*removed, *changed, *created)}
+            if touched:
+                transaction.on_commit(lambda: bump_versions(touched))
+    return len(created) + len(changed) + len(removed)
+
+
+def sync_cart_on_commit(user_id):
+    """Пересчитывает список покупок пользователя после коммита.
+
+    Строки корзины, изменённые в одной транзакции (каскадное удаление
+    рецепта или пользователя, удаление queryset), пересчитываются одним
+    вызовом sync_shopping_lists вместо вызова на каждую строку.
+    """
+    users = _pending.__dict__.setdefault('users', set())
+    users.add(user_id)
+    transaction.on_commit(sync_pending_carts)
+
+
+def sync_pending_carts():
+    users = _pending.__dict__.pop('users', None)
+    if users:
+        sync_shopping_lists(sorted(users))
+
+
+def sync_recipe(recipe_id, ingredient_ids):
+    """Обновляет списки покупок всех, у кого рецепт в корзине."""
+    return sync_shopping_lists(
+        Cart.objects.filter(recipe_id=recipe_id).values('user'),
+        ingredient_ids
+    )
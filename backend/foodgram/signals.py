@@ -0,0 +1,158 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (AuthorStats, Cart, Favorite, Follow, Ingredient, Recipe,
+                     Tag)
+from .images import delete_images
+from .search import update_search_vectors
+from .shopping_list import sync_cart_on_commit
+
+INGREDIENTS_VERSION_KEY = 'ingredients-version'
+TAGS_VERSION_KEY = 'tags-version'
+RECIPES_VERSION_KEY = 'recipes-version'
+
+
+def change_counter(queryset, field, delta):
+    # Greatest не даёт счётчику уйти в минус, если он разошёлся с данными
+    # до пересчёта командой recount_counters.
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total')
+        ),
+        0
+    )
+
+
+def recount_counter(queryset, field, related, related_field):
+    """Пересчитывает счётчик строк queryset по данным одним UPDATE.
+
+    Для пакетных записей, после которых сигналы не приходят.
+    """
+    return queryset.update(**{field: count_subquery(related, related_field)})
+
+
+def change_author_counter(user_id, field, delta):
+    updated = change_counter(
+        AuthorStats.objects.filter(user_id=user_id), field, delta
+    )
+    if not updated and delta > 0:
+        AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults={field: delta}
+        )
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def bump_ingredients_version():
+    bump_version(INGREDIENTS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    bump_ingredients_version()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(
+            Recipe.objects.filter(recipe_ingredients__ingredient=instance)
+        )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_version(TAGS_VERSION_KEY)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'favorites_count', -1
+    )
+
+
+@receiver(post_save, sender=Cart)
+def cart_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id), 'cart_count', 1
+        )
+
+
+@receiver(post_delete, sender=Cart)
+def cart_deleted(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id), 'cart_count', -1
+    )
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+def cart_changed(sender, instance, **kwargs):
+    sync_cart_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_author_counter(instance.following_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_author_counter(instance.following_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_author_counter(instance.author_id, 'recipes_count', 1)
+
+
+# Состав рецепта пишется после самого рецепта в той же транзакции,
+# поэтому вектор с названиями ингредиентов считается после коммита.
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: update_search_vectors(
+        Recipe.objects.filter(pk=instance.pk)
+    ))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_author_counter(instance.author_id, 'recipes_count', -1)
+    delete_images(instance.image.name, instance.image_variants)
+
+
+# Состав и теги рецепта пишутся в той же транзакции после сохранения
+# рецепта, поэтому версия поднимается только после коммита.
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(RECIPES_VERSION_KEY))
@@ -0,0 +1,214 @@
+"""Похожие рецепты по ингредиентам и тегам.
+
+Рецепт — разреженный вектор признаков с весами TF-IDF, нормированный
+по длине, сходство — косинус. Для каждого рецепта TOP_K ближайших
+соседей заранее считает команда build_similar_recipes и кладёт
+в SimilarRecipe, откуда API читает их по индексу (recipe, -score).
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .models import Recipe, RecipeIngredient, RecipeTag, SimilarRecipe
+
+TOP_K = 20
+TAG_WEIGHT = 0.5
+# Признаки, которые есть у большой доли рецептов (соль, теги), не дают
+# кандидатов: IDF у них маленький, а списки рецептов огромные. В сам
+# косинус они всё равно входят.
+MAX_CANDIDATE_SHARE = 0.2
+MIN_CANDIDATE_LIMIT = 100
+BATCH_SIZE = 1000
+# Доля изменённых рецептов, после которой всё считается заново.
+FULL_REBUILD_SHARE = 0.5
+
+
+def ingredient_feature(ingredient_id):
+    # Признаки — целые числа: чётные для ингредиентов, нечётные для тегов.
+    return ingredient_id * 2
+
+
+def tag_feature(tag_id):
+    return tag_id * 2 + 1
+
+
+def load_features():
+    features = defaultdict(set)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator(chunk_size=BATCH_SIZE):
+        features[recipe_id].add(ingredient_feature(ingredient_id))
+    for recipe_id, tag_id in RecipeTag.objects.values_list(
+        'recipe_id', 'tag_id'
+    ).iterator(chunk_size=BATCH_SIZE):
+        features[recipe_id].add(tag_feature(tag_id))
+    return features
+
+
+class SimilarityIndex:
+    """Векторы рецептов и обратный индекс признак -> рецепты."""
+
+    def __init__(self, features):
+        total = len(features)
+        frequency = Counter(
+            feature for keys in features.values() for feature in keys
+        )
+        candidate_limit = max(
+            MIN_CANDIDATE_LIMIT, MAX_CANDIDATE_SHARE * total
+        )
+        idf = {
+            feature: (math.log((1 + total) / (1 + count)) + 1)
+            * (TAG_WEIGHT if feature % 2 else 1.0)
+            for feature, count in frequency.items()
+        }
+        self.vectors = {}
+        self.postings = defaultdict(list)
+        self.frequent = defaultdict(dict)
+        for recipe_id, keys in features.items():
+            weights = {feature: idf[feature] for feature in keys}
+            norm = math.sqrt(sum(weight ** 2 for weight in weights.values()))
+            vector = {
+                feature: weight / norm for feature, weight in weights.items()
+            }
+            self.vectors[recipe_id] = vector
+            for feature, weight in vector.items():
+                if frequency[feature] <= candidate_limit:
+                    self.postings[feature].append((recipe_id, weight))
+                else:
+                    self.frequent[feature][recipe_id] = weight
+
+    def scores(self, recipe_id):
+        """Косинус рецепта со всеми рецептами, у которых есть общий
+        не слишком частый признак.
+
+        Вклад редких признаков набирается по обратному индексу, частые
+        досчитываются только для найденных кандидатов.
+        """
+        vector = self.vectors.get(recipe_id)
+        if not vector:
+            return {}
+        scores = defaultdict(float)
+        for feature, weight in vector.items():
+            for other_id, other_weight in self.postings.get(feature, ()):
+                scores[other_id] += weight * other_weight
+        scores.pop(recipe_id, None)
+        for feature, weight in vector.items():
+            weights = self.frequent.get(feature)
+            if weights is None:
+                continue
+            for other_id in scores:
+                other_weight = weights.get(other_id)
+                if other_weight:
+                    scores[other_id] += weight * other_weight
+        return scores
+
+    def neighbours(self, recipe_id, scores=None):
+        if scores is None:
+            scores = self.scores(recipe_id)
+        return heapq.nlargest(
+            TOP_K, scores.items(), key=lambda item: (item[1], -item[0])
+        )
+
+
+def get_outdated():
+    """Рецепты, которые менялись после последнего расчёта соседей,
+    и общее число рецептов."""
+    outdated, total = set(), 0
+    for pk, updated, similar_updated in Recipe.objects.values_list(
+        'pk', 'updated', 'similar_updated'
+    ).iterator(chunk_size=BATCH_SIZE):
+        total += 1
+        if similar_updated is None or updated > similar_updated:
+            outdated.add(pk)
+    return outdated, total
+
+
+def get_lists():
+    """Размер и наименьший score сохранённого top-k рецептов."""
+    return {
+        row['recipe']: (row['size'], row['lowest'])
+        for row in SimilarRecipe.objects.values('recipe').annotate(
+            size=Count('pk'), lowest=Min('score')
+        ).order_by()
+    }
+
+
+def get_affected(scores, lists):
+    """Рецепты, в чей top-k должен войти рецепт с косинусами scores."""
+    return {
+        other_id for other_id, score in scores.items()
+        if lists.get(other_id, (0, 0.0))[0] < TOP_K
+        or score > lists[other_id][1]
+    }
+
+
+def get_containing(ids):
+    """Рецепты, в чьём сохранённом top-k есть один из рецептов ids."""
+    return set(SimilarRecipe.objects.filter(similar__in=ids).values_list(
+        'recipe', flat=True
+    ))
+
+
+def save_neighbours(neighbours, started):
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe__in=list(neighbours)).delete()
+        SimilarRecipe.objects.bulk_create([
+            SimilarRecipe(
+                recipe_id=recipe_id, similar_id=similar_id,
+                score=round(score, 6)
+            )
+            for recipe_id, found in neighbours.items()
+            for similar_id, score in found
+        ], batch_size=BATCH_SIZE)
+        Recipe.objects.filter(pk__in=list(neighbours)).update(
+            similar_updated=started
+        )
+
+
+def save_batches(index, recipe_ids, started):
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        save_neighbours({
+            pk: index.neighbours(pk)
+            for pk in recipe_ids[start:start + BATCH_SIZE]
+        }, started)
+
+
+def build_similar_recipes(started, full=False):
+    """Пересчитывает соседей изменённых рецептов и тех, чьи списки
+    они меняют. IDF при этом берётся по текущим данным, поэтому
+    время от времени стоит пересчитывать всё с full=True.
+
+    Косинусы рецепта нужны только до выбора его соседей, в памяти
+    одновременно держатся косинусы одного рецепта и соседи одной пачки
+    в BATCH_SIZE рецептов. Возвращает число пересчитанных рецептов.
+    """
+    features = load_features()
+    outdated, total = get_outdated()
+    for pk in outdated:
+        features.setdefault(pk, set())
+    index = SimilarityIndex(features)
+    # При первом запуске (similar_updated везде пуст) и после массовых
+    # изменений почти все рецепты и так пересчитываются, а поиск
+    # затронутых только тратит время.
+    if full or len(outdated) > FULL_REBUILD_SHARE * total:
+        recompute = sorted(set(features) | outdated)
+        save_batches(index, recompute, started)
+        return len(recompute)
+    lists = get_lists()
+    outdated_ids = sorted(outdated)
+    affected = set()
+    for start in range(0, len(outdated_ids), BATCH_SIZE):
+        batch = outdated_ids[start:start + BATCH_SIZE]
+        affected |= get_containing(batch)
+        neighbours = {}
+        for pk in batch:
+            scores = index.scores(pk)
+            affected |= get_affected(scores, lists)
+            neighbours[pk] = index.neighbours(pk, scores)
+        save_neighbours(neighbours, started)
+    affected = sorted((affected & set(index.vectors)) - outdated)
+    save_batches(index, affected, started)
+    return len(outdated_ids) + len(affected)